@@ -3,13 +3,17 @@ EPL CAS 2026 Dashboard - Flask Application
 Dashboard completo para supervisiones CAS con estilo iOS
 """
 
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from flask import Flask, render_template, jsonify, request, session, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import text
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date, datetime
 
 load_dotenv()
 
@@ -28,6 +32,10 @@ db = SQLAlchemy(app)
 
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '20Bube85!21637543')
 
+# Cache de respuestas /api/* (0 = sin cache; los ETags siguen activos)
+API_CACHE_MAX = int(os.environ.get('API_CACHE_MAX', '512'))  # Respuestas guardadas por proceso
+API_CACHE_VERSION_TTL = float(os.environ.get('API_CACHE_VERSION_TTL', '10'))  # Segundos entre lecturas de la versión
+
 # ============ HELPERS ============
 def get_color_class(value):
     """Retorna clase de color según rendimiento"""
@@ -62,28 +70,35 @@ GRUPOS_AGRUPACIONES = {
     }
 }
 
+# Rollups que mantiene el ETL (etl_sync.refrescar_rollups): suma / cuenta por
+# (tipo, periodo, sucursal), (tipo, periodo, grupo) y (tipo, periodo). PROMEDIO_ROLLUP es
+# exactamente el AVG(calificacion_general) de las supervisiones agregadas.
+PROMEDIO_ROLLUP = "SUM(r.suma) / NULLIF(SUM(r.cuenta), 0)"
+
+def tipo_rollup(tipo):
+    """Tipo con que el ETL guarda los rollups (todo lo que no es operativas es seguridad)"""
+    return 'operativas' if tipo == 'operativas' else 'seguridad'
+
 def calcular_promedio_agrupacion(patron, tipo, periodo_id=None):
     """
     Calcula promedio de una agrupación usando TODAS las supervisiones
     de los grupos que coinciden con el patrón (promedio ponderado correcto)
     """
-    tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
-
     query = f"""
-        SELECT AVG(sup.calificacion_general) as promedio,
-               COUNT(sup.id) as total_supervisiones,
+        SELECT {PROMEDIO_ROLLUP} as promedio,
+               COALESCE(SUM(r.supervisiones), 0) as total_supervisiones,
                COUNT(DISTINCT g.id) as total_grupos,
                COUNT(DISTINCT s.id) as total_sucursales
         FROM grupos_operativos g
         JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
-        JOIN {tabla} sup ON s.id = sup.sucursal_id
+        JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo
         WHERE g.activo = true
           AND g.nombre LIKE :patron
     """
-    params = {'patron': patron}
+    params = {'patron': patron, 'tipo': tipo_rollup(tipo)}
 
     if periodo_id and periodo_id != 'all':
-        query += " AND sup.periodo_id = :periodo_id"
+        query += " AND r.periodo_id = :periodo_id"
         params['periodo_id'] = periodo_id
 
     return db.session.execute(text(query), params).fetchone()
@@ -97,6 +112,137 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ============ CACHE DE RESPUESTAS ============
+# Los datos sólo cambian cuando el ETL (etl_sync.publicar_version_dashboard) o
+# el admin escriben una fila exitosa en sync_log: su id es la versión de datos.
+# Cada worker de gunicorn guarda sus respuestas JSON por endpoint + argumentos y
+# las descarta todas cuando cambia la versión (o el día, por periodo-contexto).
+# La misma versión da el ETag: el navegador revalida y recibe 304 sin tocar la BD.
+ARGS_CACHEABLES = ('periodo_id', 'territorio', 'grupo_id')
+# Otro deploy puede cambiar la forma del JSON con la misma versión de datos
+VERSION_CODIGO = os.environ.get('RAILWAY_GIT_COMMIT_SHA') or str(os.path.getmtime(__file__))
+
+class CacheRespuestas:
+    """LRU de respuestas JSON invalidado por la versión de datos"""
+
+    def __init__(self, maximo, ttl_version):
+        self.maximo = maximo
+        self.ttl_version = ttl_version
+        self.entradas = OrderedDict()
+        self.version = None
+        self.version_leida = 0.0
+        self.hits = self.misses = self.descartes = self.no_modificadas = 0
+        self.lock = threading.Lock()
+
+    def version_actual(self):
+        """Id del último sync_log exitoso + fecha; se relee cada ttl_version segundos"""
+        ahora = time.monotonic()
+        if self.version is not None and ahora - self.version_leida < self.ttl_version:
+            return self.version
+        try:
+            ultimo = db.session.execute(text(
+                "SELECT MAX(id) FROM sync_log WHERE estado = 'success'")).scalar()
+        except Exception:
+            db.session.rollback()
+            return None
+        version = (ultimo, date.today().isoformat())
+        with self.lock:
+            if version != self.version:
+                self.entradas.clear()
+                self.version = version
+            self.version_leida = ahora
+        return version
+
+    def invalidar(self):
+        """Descarta todo y fuerza releer la versión (tras una escritura del admin)"""
+        with self.lock:
+            self.entradas.clear()
+            self.version = None
+
+    def get(self, clave, version):
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None or entrada[0] != version:
+                self.misses += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[1]
+
+    def no_modificada(self):
+        with self.lock:
+            self.no_modificadas += 1
+
+    def put(self, clave, version, datos):
+        with self.lock:
+            if version != self.version:
+                return  # La versión cambió mientras se calculaba
+            self.entradas[clave] = (version, datos)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.maximo:
+                self.entradas.popitem(last=False)
+                self.descartes += 1
+
+    def stats(self):
+        with self.lock:
+            consultas = self.hits + self.misses
+            return {
+                'entradas': len(self.entradas), 'maximo': self.maximo,
+                'hits': self.hits, 'misses': self.misses, 'descartes': self.descartes,
+                'no_modificadas': self.no_modificadas,
+                'hit_rate': round(self.hits / consultas, 3) if consultas else None,
+                'version': self.version[0] if self.version else None
+            }
+
+cache_respuestas = CacheRespuestas(API_CACHE_MAX, API_CACHE_VERSION_TTL)
+
+def cache_api(f):
+    """
+    Respuestas 200 del endpoint con ETag fuerte y, si API_CACHE_MAX > 0, desde el cache
+
+    La clave (ruta + ARGS_CACHEABLES) y la versión de datos definen el ETag antes
+    de ejecutar el endpoint: un If-None-Match que coincide recibe 304 sin SQL.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        version = cache_respuestas.version_actual()
+        if version is None:
+            return f(*args, **kwargs)
+        clave = (request.path,) + tuple(request.args.get(a) for a in ARGS_CACHEABLES)
+        etag = hashlib.sha1(repr((VERSION_CODIGO, version, clave)).encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            cache_respuestas.no_modificada()
+            respuesta = app.response_class(status=304)
+        else:
+            datos = cache_respuestas.get(clave, version) if API_CACHE_MAX > 0 else None
+            if datos is None:
+                respuesta = app.make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200 or not respuesta.is_json:
+                    return respuesta
+                datos = respuesta.get_data()
+                if API_CACHE_MAX > 0:
+                    cache_respuestas.put(clave, version, datos)
+                estado = 'MISS'
+            else:
+                estado = 'HIT'
+            respuesta = app.response_class(datos, mimetype='application/json')
+            respuesta.headers['X-Cache'] = estado
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'no-cache'  # Guardar, pero revalidar siempre
+        return respuesta
+    return decorated_function
+
+def registrar_cambio_admin(workflow):
+    """
+    Nueva versión de datos por una escritura del admin (en su misma transacción)
+
+    Va a sync_log como el ETL para que también la vean los otros workers.
+    """
+    db.session.execute(text("""
+        INSERT INTO sync_log (workflow, inicio, fin, registros_nuevos, estado)
+        VALUES (:workflow, NOW(), NOW(), 0, 'success')
+    """), {'workflow': workflow})
+
 # ============ RUTAS PRINCIPALES ============
 @app.route('/')
 def index():
@@ -175,7 +321,9 @@ def admin_set_periodo():
         db.session.execute(text("UPDATE periodos_cas SET activo = false"))
         # Activar el seleccionado
         db.session.execute(text("UPDATE periodos_cas SET activo = true WHERE id = :id"), {'id': periodo_id})
+        registrar_cambio_admin('admin_set_periodo')
         db.session.commit()
+        cache_respuestas.invalidar()
 
         return redirect(url_for('admin'))
     except Exception as e:
@@ -200,7 +348,9 @@ def admin_update_periodo():
             SET fecha_inicio = :fecha_inicio, fecha_fin = :fecha_fin
             WHERE id = :id
         """), {'id': periodo_id, 'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin})
+        registrar_cambio_admin('admin_update_periodo')
         db.session.commit()
+        cache_respuestas.invalidar()
 
         return jsonify({'success': True})
     except Exception as e:
@@ -209,102 +359,104 @@ def admin_update_periodo():
 
 # ============ API ENDPOINTS - PERIODO CONTEXTO ============
 @app.route('/api/periodo-contexto/<tipo>')
+@cache_api
 def api_periodo_contexto(tipo):
     """Obtener contexto del periodo actual para el dashboard"""
     try:
-        from datetime import date
-        hoy = date.today()
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
+        return jsonify({'success': True, 'data': contexto_periodo(tipo)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # 1. Buscar periodo activo (primero por fecha actual, luego por flag activo)
-        periodo_actual = None
+def contexto_periodo(tipo):
+    """Periodo actual, últimos periodos para el selector y progreso de sucursales"""
+    hoy = date.today()
+    tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
 
-        # Intentar por fecha actual
+    # 1. Buscar periodo activo (primero por fecha actual, luego por flag activo)
+    periodo_actual = None
+
+    # Intentar por fecha actual
+    result = db.session.execute(text("""
+        SELECT id, codigo, nombre, fecha_inicio, fecha_fin
+        FROM periodos_cas
+        WHERE fecha_inicio <= :hoy AND fecha_fin >= :hoy
+        ORDER BY fecha_inicio DESC LIMIT 1
+    """), {'hoy': hoy})
+    row = result.fetchone()
+
+    if row:
+        periodo_actual = {
+            'id': row[0], 'codigo': row[1], 'nombre': row[2],
+            'fecha_inicio': str(row[3]), 'fecha_fin': str(row[4]),
+            'metodo': 'fecha'
+        }
+    else:
+        # Si no hay match por fecha, buscar el marcado como activo
         result = db.session.execute(text("""
             SELECT id, codigo, nombre, fecha_inicio, fecha_fin
-            FROM periodos_cas
-            WHERE fecha_inicio <= :hoy AND fecha_fin >= :hoy
+            FROM periodos_cas WHERE activo = true
             ORDER BY fecha_inicio DESC LIMIT 1
-        """), {'hoy': hoy})
+        """))
         row = result.fetchone()
-
         if row:
             periodo_actual = {
                 'id': row[0], 'codigo': row[1], 'nombre': row[2],
                 'fecha_inicio': str(row[3]), 'fecha_fin': str(row[4]),
-                'metodo': 'fecha'
+                'metodo': 'activo'
             }
         else:
-            # Si no hay match por fecha, buscar el marcado como activo
-            result = db.session.execute(text("""
-                SELECT id, codigo, nombre, fecha_inicio, fecha_fin
-                FROM periodos_cas WHERE activo = true
-                ORDER BY fecha_inicio DESC LIMIT 1
+            # Fallback: último periodo con datos
+            result = db.session.execute(text(f"""
+                SELECT p.id, p.codigo, p.nombre, p.fecha_inicio, p.fecha_fin
+                FROM periodos_cas p
+                JOIN {tabla} s ON s.periodo_id = p.id
+                GROUP BY p.id, p.codigo, p.nombre, p.fecha_inicio, p.fecha_fin
+                ORDER BY p.fecha_inicio DESC LIMIT 1
             """))
             row = result.fetchone()
             if row:
                 periodo_actual = {
                     'id': row[0], 'codigo': row[1], 'nombre': row[2],
                     'fecha_inicio': str(row[3]), 'fecha_fin': str(row[4]),
-                    'metodo': 'activo'
+                    'metodo': 'ultimo_con_datos'
                 }
-            else:
-                # Fallback: último periodo con datos
-                result = db.session.execute(text(f"""
-                    SELECT p.id, p.codigo, p.nombre, p.fecha_inicio, p.fecha_fin
-                    FROM periodos_cas p
-                    JOIN {tabla} s ON s.periodo_id = p.id
-                    GROUP BY p.id, p.codigo, p.nombre, p.fecha_inicio, p.fecha_fin
-                    ORDER BY p.fecha_inicio DESC LIMIT 1
-                """))
-                row = result.fetchone()
-                if row:
-                    periodo_actual = {
-                        'id': row[0], 'codigo': row[1], 'nombre': row[2],
-                        'fecha_inicio': str(row[3]), 'fecha_fin': str(row[4]),
-                        'metodo': 'ultimo_con_datos'
-                    }
-
-        # 2. Lista de periodos para el selector (últimos 6)
-        result = db.session.execute(text("""
-            SELECT id, codigo, nombre, fecha_inicio, fecha_fin
-            FROM periodos_cas ORDER BY fecha_inicio DESC LIMIT 6
-        """))
-        periodos = [{'id': r[0], 'codigo': r[1], 'nombre': r[2],
-                     'fecha_inicio': str(r[3]) if r[3] else '',
-                     'fecha_fin': str(r[4]) if r[4] else ''} for r in result]
 
-        # 3. Progreso de sucursales en el periodo actual
-        progreso = {'supervisadas': 0, 'total': 86, 'porcentaje': 0}
-        if periodo_actual:
-            result = db.session.execute(text(f"""
-                SELECT COUNT(DISTINCT sucursal_id) FROM {tabla}
-                WHERE periodo_id = :periodo_id
-            """), {'periodo_id': periodo_actual['id']})
-            supervisadas = result.scalar() or 0
-
-            result = db.session.execute(text("SELECT COUNT(*) FROM sucursales WHERE activo = true"))
-            total = result.scalar() or 86
-
-            progreso = {
-                'supervisadas': supervisadas,
-                'total': total,
-                'porcentaje': round((supervisadas / total * 100) if total > 0 else 0, 1)
-            }
+    # 2. Lista de periodos para el selector (últimos 6)
+    result = db.session.execute(text("""
+        SELECT id, codigo, nombre, fecha_inicio, fecha_fin
+        FROM periodos_cas ORDER BY fecha_inicio DESC LIMIT 6
+    """))
+    periodos = [{'id': r[0], 'codigo': r[1], 'nombre': r[2],
+                 'fecha_inicio': str(r[3]) if r[3] else '',
+                 'fecha_fin': str(r[4]) if r[4] else ''} for r in result]
+
+    # 3. Progreso de sucursales en el periodo actual
+    progreso = {'supervisadas': 0, 'total': 86, 'porcentaje': 0}
+    if periodo_actual:
+        result = db.session.execute(text("""
+            SELECT COUNT(DISTINCT sucursal_id) FROM rollup_sucursal
+            WHERE tipo = :tipo AND periodo_id = :periodo_id
+        """), {'tipo': tipo_rollup(tipo), 'periodo_id': periodo_actual['id']})
+        supervisadas = result.scalar() or 0
+
+        result = db.session.execute(text("SELECT COUNT(*) FROM sucursales WHERE activo = true"))
+        total = result.scalar() or 86
+
+        progreso = {
+            'supervisadas': supervisadas,
+            'total': total,
+            'porcentaje': round((supervisadas / total * 100) if total > 0 else 0, 1)
+        }
 
-        return jsonify({
-            'success': True,
-            'data': {
-                'periodo_actual': periodo_actual,
-                'periodos': periodos,
-                'progreso': progreso
-            }
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return {
+        'periodo_actual': periodo_actual,
+        'periodos': periodos,
+        'progreso': progreso
+    }
 
 # ============ API ENDPOINTS - DATOS BÁSICOS ============
 @app.route('/api/periodos')
+@cache_api
 def api_periodos():
     """Obtener todos los periodos CAS"""
     try:
@@ -325,6 +477,7 @@ def api_periodos():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/estados')
+@cache_api
 def api_estados():
     """Obtener lista de estados con sucursales"""
     try:
@@ -340,420 +493,378 @@ def api_estados():
 
 # ============ API ENDPOINTS - KPIs DASHBOARD ============
 @app.route('/api/kpis/<tipo>')
+@cache_api
 def api_kpis(tipo):
     """KPIs principales del dashboard"""
     try:
-        periodo_id = request.args.get('periodo_id')
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
-
-        params = {}
-        params_periodo = {}
-
-        # Promedio del periodo (si hay periodo_id)
-        if periodo_id and periodo_id != 'all':
-            query_prom = f"SELECT AVG(calificacion_general) FROM {tabla} WHERE periodo_id = :periodo_id"
-            params_periodo['periodo_id'] = periodo_id
-            promedio_periodo = db.session.execute(text(query_prom), params_periodo).scalar() or 0
-        else:
-            promedio_periodo = None
-
-        # Promedio acumulado (siempre histórico total)
-        promedio_acumulado = db.session.execute(text(f"SELECT AVG(calificacion_general) FROM {tabla}")).scalar() or 0
-
-        # Total supervisiones
-        if periodo_id and periodo_id != 'all':
-            query_total = f"SELECT COUNT(*) FROM {tabla} WHERE periodo_id = :periodo_id"
-            total_supervisiones = db.session.execute(text(query_total), params_periodo).scalar() or 0
-        else:
-            total_supervisiones = db.session.execute(text(f"SELECT COUNT(*) FROM {tabla}")).scalar() or 0
-
-        # Sucursales supervisadas
-        if periodo_id and periodo_id != 'all':
-            query_suc = f"SELECT COUNT(DISTINCT sucursal_id) FROM {tabla} WHERE periodo_id = :periodo_id"
-            sucursales_supervisadas = db.session.execute(text(query_suc), params_periodo).scalar() or 0
-        else:
-            sucursales_supervisadas = db.session.execute(text(f"SELECT COUNT(DISTINCT sucursal_id) FROM {tabla}")).scalar() or 0
-
-        # Total sucursales
-        total_sucursales = db.session.execute(text("SELECT COUNT(*) FROM sucursales WHERE activo = true")).scalar() or 0
-
-        # Total grupos
-        total_grupos = db.session.execute(text("SELECT COUNT(*) FROM grupos_operativos WHERE activo = true")).scalar() or 0
+        return jsonify({'success': True, 'data': calcular_kpis(tipo, request.args.get('periodo_id'))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Cobertura
-        cobertura = round((sucursales_supervisadas / total_sucursales * 100) if total_sucursales > 0 else 0, 1)
-
-        # Distribución por rendimiento
-        query_dist = f"""
-            SELECT
-                SUM(CASE WHEN calificacion_general >= 90 THEN 1 ELSE 0 END) as excelente,
-                SUM(CASE WHEN calificacion_general >= 80 AND calificacion_general < 90 THEN 1 ELSE 0 END) as bueno,
-                SUM(CASE WHEN calificacion_general >= 70 AND calificacion_general < 80 THEN 1 ELSE 0 END) as regular,
-                SUM(CASE WHEN calificacion_general < 70 THEN 1 ELSE 0 END) as critico
-            FROM {tabla}
-        """
-        if periodo_id and periodo_id != 'all':
-            query_dist += " WHERE periodo_id = :periodo_id"
-            dist_result = db.session.execute(text(query_dist), params_periodo).fetchone()
-        else:
-            dist_result = db.session.execute(text(query_dist)).fetchone()
+def calcular_kpis(tipo, periodo_id=None):
+    """
+    KPIs del periodo (o de todo el histórico con None / 'all') en una sola consulta
 
-        distribucion = {
-            'excelente': dist_result[0] or 0,
-            'bueno': dist_result[1] or 0,
-            'regular': dist_result[2] or 0,
-            'critico': dist_result[3] or 0
+    Sale de rollup_periodo (una fila por periodo): el promedio acumulado y los
+    agregados del periodo (FILTER) en el mismo recorrido, los catálogos en
+    subconsultas. Sólo "todo el histórico" necesita contar sucursales distintas
+    en rollup_sucursal; esa subconsulta no se ejecuta con periodo.
+    """
+    con_periodo = bool(periodo_id and periodo_id != 'all')
+    en_periodo = "(CAST(:periodo_id AS INTEGER) IS NULL OR r.periodo_id = CAST(:periodo_id AS INTEGER))"
+    row = db.session.execute(text(f"""
+        SELECT SUM(r.suma) FILTER (WHERE {en_periodo})
+                   / NULLIF(SUM(r.cuenta) FILTER (WHERE {en_periodo}), 0) as promedio_periodo,
+               {PROMEDIO_ROLLUP} as promedio_acumulado,
+               SUM(r.supervisiones) FILTER (WHERE {en_periodo}) as total_supervisiones,
+               CASE WHEN CAST(:periodo_id AS INTEGER) IS NULL
+                    THEN (SELECT COUNT(DISTINCT sucursal_id) FROM rollup_sucursal WHERE tipo = :tipo)
+                    ELSE SUM(r.sucursales) FILTER (WHERE {en_periodo})
+               END as sucursales_supervisadas,
+               SUM(r.excelente) FILTER (WHERE {en_periodo}) as excelente,
+               SUM(r.bueno) FILTER (WHERE {en_periodo}) as bueno,
+               SUM(r.regular) FILTER (WHERE {en_periodo}) as regular,
+               SUM(r.critico) FILTER (WHERE {en_periodo}) as critico,
+               (SELECT COUNT(*) FROM sucursales WHERE activo = true) as total_sucursales,
+               (SELECT COUNT(*) FROM grupos_operativos WHERE activo = true) as total_grupos
+        FROM rollup_periodo r
+        WHERE r.tipo = :tipo
+    """), {'tipo': tipo_rollup(tipo), 'periodo_id': periodo_id if con_periodo else None}).mappings().one()
+
+    # Promedio del periodo (si hay periodo_id); acumulado siempre histórico total
+    promedio_periodo = (row['promedio_periodo'] or 0) if con_periodo else None
+    promedio_acumulado = row['promedio_acumulado'] or 0
+    sucursales_supervisadas = row['sucursales_supervisadas'] or 0
+    total_sucursales = row['total_sucursales'] or 0
+
+    # Cobertura
+    cobertura = round((sucursales_supervisadas / total_sucursales * 100) if total_sucursales > 0 else 0, 1)
+
+    # Promedio a mostrar: del periodo si existe, si no acumulado
+    promedio_mostrar = promedio_periodo if promedio_periodo is not None else promedio_acumulado
+
+    return {
+        'promedio': float(round(promedio_mostrar, 2)),
+        'promedio_periodo': float(round(promedio_periodo, 2)) if promedio_periodo is not None else None,
+        'promedio_acumulado': float(round(promedio_acumulado, 2)),
+        'color': get_color_class(promedio_mostrar),
+        'total_supervisiones': int(row['total_supervisiones'] or 0),
+        'sucursales_supervisadas': int(sucursales_supervisadas),
+        'total_sucursales': int(total_sucursales),
+        'total_grupos': int(row['total_grupos'] or 0),
+        'cobertura': float(cobertura),
+        'distribucion': {
+            'excelente': int(row['excelente'] or 0),
+            'bueno': int(row['bueno'] or 0),
+            'regular': int(row['regular'] or 0),
+            'critico': int(row['critico'] or 0)
         }
-
-        # Promedio a mostrar: del periodo si existe, si no acumulado
-        promedio_mostrar = promedio_periodo if promedio_periodo is not None else promedio_acumulado
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'promedio': float(round(promedio_mostrar, 2)),
-                'promedio_periodo': float(round(promedio_periodo, 2)) if promedio_periodo is not None else None,
-                'promedio_acumulado': float(round(promedio_acumulado, 2)),
-                'color': get_color_class(promedio_mostrar),
-                'total_supervisiones': int(total_supervisiones),
-                'sucursales_supervisadas': int(sucursales_supervisadas),
-                'total_sucursales': int(total_sucursales),
-                'total_grupos': int(total_grupos),
-                'cobertura': float(cobertura),
-                'distribucion': {
-                    'excelente': int(distribucion['excelente']),
-                    'bueno': int(distribucion['bueno']),
-                    'regular': int(distribucion['regular']),
-                    'critico': int(distribucion['critico'])
-                }
-            }
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    }
 
 # ============ API ENDPOINTS - RANKINGS ============
 @app.route('/api/ranking/grupos/<tipo>')
+@cache_api
 def api_ranking_grupos(tipo):
     """Ranking de grupos operativos - con empates y agrupaciones"""
     try:
-        periodo_id = request.args.get('periodo_id')
         territorio = request.args.get('territorio')  # local, foranea, mixto, todas
+        return jsonify({'success': True, 'data': ranking_grupos(tipo, request.args.get('periodo_id'), territorio)})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
-
-        # Query que incluye todos los grupos
-        if periodo_id and periodo_id != 'all':
-            query = f"""
-                SELECT g.id, g.nombre,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(DISTINCT s.id) as total_sucursales,
-                       COUNT(sup.id) as total_supervisiones
-                FROM grupos_operativos g
-                LEFT JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id AND sup.periodo_id = :periodo_id
-                WHERE g.activo = true
-                GROUP BY g.id, g.nombre
-                ORDER BY promedio DESC NULLS LAST, g.nombre ASC
-            """
-            params = {'periodo_id': periodo_id}
-        else:
-            query = f"""
-                SELECT g.id, g.nombre,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(DISTINCT s.id) as total_sucursales,
-                       COUNT(sup.id) as total_supervisiones
-                FROM grupos_operativos g
-                LEFT JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id
-                WHERE g.activo = true
-                GROUP BY g.id, g.nombre
-                ORDER BY promedio DESC NULLS LAST, g.nombre ASC
-            """
-            params = {}
+def ranking_grupos(tipo, periodo_id=None, territorio=None):
+    """Grupos activos (con agrupaciones) ordenados por promedio, con posiciones y empates"""
+    # Query que incluye todos los grupos
+    filtro_periodo = ''
+    params = {'tipo': tipo_rollup(tipo)}
+    if periodo_id and periodo_id != 'all':
+        filtro_periodo = ' AND r.periodo_id = :periodo_id'
+        params['periodo_id'] = periodo_id
+    query = f"""
+        SELECT g.id, g.nombre,
+               {PROMEDIO_ROLLUP} as promedio,
+               (SELECT COUNT(*) FROM sucursales s
+                WHERE s.grupo_operativo_id = g.id AND s.activo = true) as total_sucursales,
+               COALESCE(SUM(r.supervisiones), 0) as total_supervisiones
+        FROM grupos_operativos g
+        LEFT JOIN rollup_grupo r ON r.grupo_id = g.id AND r.tipo = :tipo{filtro_periodo}
+        WHERE g.activo = true
+        GROUP BY g.id, g.nombre
+        ORDER BY promedio DESC NULLS LAST, g.nombre ASC
+    """
 
-        result = db.session.execute(text(query), params)
-        rows = list(result)
+    result = db.session.execute(text(query), params)
+    rows = list(result)
 
-        # Identificar grupos que pertenecen a agrupaciones
-        grupos_agrupados = {}  # {key_agrupacion: [grupos]}
-        grupos_independientes = []
+    # Identificar grupos que pertenecen a agrupaciones
+    grupos_agrupados = {}  # {key_agrupacion: [grupos]}
+    grupos_independientes = []
 
-        for row in rows:
-            grupo_nombre = row[1]
-            grupo_territorio = get_territorio(grupo_nombre)
+    for row in rows:
+        grupo_nombre = row[1]
+        grupo_territorio = get_territorio(grupo_nombre)
 
-            # Filtrar por territorio si se especifica
-            if territorio and territorio != 'todas':
-                if territorio == 'local' and grupo_territorio not in ['local', 'mixto']:
-                    continue
-                if territorio == 'foranea' and grupo_territorio not in ['foranea', 'mixto']:
-                    continue
-                if territorio == 'mixto' and grupo_territorio != 'mixto':
-                    continue
+        # Filtrar por territorio si se especifica
+        if territorio and territorio != 'todas':
+            if territorio == 'local' and grupo_territorio not in ['local', 'mixto']:
+                continue
+            if territorio == 'foranea' and grupo_territorio not in ['foranea', 'mixto']:
+                continue
+            if territorio == 'mixto' and grupo_territorio != 'mixto':
+                continue
 
-            item = {
-                'id': row[0],
-                'nombre': row[1],
-                'promedio': round(float(row[2]), 2) if row[2] else None,
-                'total_sucursales': row[3],
-                'total_supervisiones': row[4],
-                'territorio': grupo_territorio,
-                'tipo': 'grupo'
-            }
+        item = {
+            'id': row[0],
+            'nombre': row[1],
+            'promedio': round(float(row[2]), 2) if row[2] else None,
+            'total_sucursales': row[3],
+            'total_supervisiones': row[4],
+            'territorio': grupo_territorio,
+            'tipo': 'grupo'
+        }
 
-            # Verificar si pertenece a alguna agrupación
-            es_agrupado = False
-            for key, config in GRUPOS_AGRUPACIONES.items():
-                patron_check = config['patron'].replace('%', '').strip()
-                if grupo_nombre.upper().startswith(patron_check):
-                    if key not in grupos_agrupados:
-                        grupos_agrupados[key] = []
-                    grupos_agrupados[key].append(item)
-                    es_agrupado = True
-                    break
-
-            if not es_agrupado:
-                grupos_independientes.append(item)
-
-        # Construir agrupaciones con sus promedios calculados correctamente
-        agrupaciones_items = []
+        # Verificar si pertenece a alguna agrupación
+        es_agrupado = False
         for key, config in GRUPOS_AGRUPACIONES.items():
-            if key not in grupos_agrupados or len(grupos_agrupados[key]) == 0:
+            patron_check = config['patron'].replace('%', '').strip()
+            if grupo_nombre.upper().startswith(patron_check):
+                if key not in grupos_agrupados:
+                    grupos_agrupados[key] = []
+                grupos_agrupados[key].append(item)
+                es_agrupado = True
+                break
+
+        if not es_agrupado:
+            grupos_independientes.append(item)
+
+    # Construir agrupaciones con sus promedios calculados correctamente
+    agrupaciones_items = []
+    for key, config in GRUPOS_AGRUPACIONES.items():
+        if key not in grupos_agrupados or len(grupos_agrupados[key]) == 0:
+            continue
+
+        grupos_en_agrupacion = grupos_agrupados[key]
+
+        # Calcular promedio ponderado de la agrupación
+        # Filtrar por territorio si aplica
+        if territorio and territorio != 'todas':
+            # Recalcular promedio solo con grupos filtrados
+            grupos_filtrados_ids = [g['id'] for g in grupos_en_agrupacion]
+            if not grupos_filtrados_ids:
                 continue
 
-            grupos_en_agrupacion = grupos_agrupados[key]
-
-            # Calcular promedio ponderado de la agrupación
-            # Filtrar por territorio si aplica
-            if territorio and territorio != 'todas':
-                # Recalcular promedio solo con grupos filtrados
-                grupos_filtrados_ids = [g['id'] for g in grupos_en_agrupacion]
-                if not grupos_filtrados_ids:
-                    continue
-
-                # Query para promedio filtrado por grupos específicos
-                query_agrup = f"""
-                    SELECT AVG(sup.calificacion_general) as promedio,
-                           COUNT(sup.id) as total_supervisiones,
-                           COUNT(DISTINCT g.id) as total_grupos,
-                           COUNT(DISTINCT s.id) as total_sucursales
-                    FROM grupos_operativos g
-                    JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
-                    JOIN {tabla} sup ON s.id = sup.sucursal_id
-                    WHERE g.activo = true AND g.id IN :grupo_ids
-                """
-                params_agrup = {'grupo_ids': tuple(grupos_filtrados_ids)}
-                if periodo_id and periodo_id != 'all':
-                    query_agrup += " AND sup.periodo_id = :periodo_id"
-                    params_agrup['periodo_id'] = periodo_id
-                agrup_data = db.session.execute(text(query_agrup), params_agrup).fetchone()
-            else:
-                # Usar función helper para calcular promedio de toda la agrupación
-                agrup_data = calcular_promedio_agrupacion(config['patron'], tipo, periodo_id)
-
-            if agrup_data and agrup_data[0] is not None:
-                promedio_agrup = round(float(agrup_data[0]), 2)
-                total_supervisiones = agrup_data[1] or 0
-                total_grupos = agrup_data[2] or len(grupos_en_agrupacion)
-                total_sucursales = agrup_data[3] or 0
-            else:
-                # Sin supervisiones
-                promedio_agrup = None
-                total_supervisiones = 0
-                total_grupos = len(grupos_en_agrupacion)
-                total_sucursales = sum(g['total_sucursales'] for g in grupos_en_agrupacion)
-
-            # Ordenar grupos dentro de la agrupación por promedio
-            grupos_ordenados = sorted(
-                grupos_en_agrupacion,
-                key=lambda x: (x['promedio'] is None, -(x['promedio'] or 0))
-            )
-
-            # Asignar posiciones internas a grupos
-            pos_interna = 1
-            prev_prom = None
-            for g in grupos_ordenados:
-                if g['promedio'] is not None:
-                    if prev_prom is not None and g['promedio'] == prev_prom:
-                        g['posicion_interna'] = grupos_ordenados[grupos_ordenados.index(g) - 1].get('posicion_interna', pos_interna)
-                    else:
-                        g['posicion_interna'] = pos_interna
-                    g['color'] = get_color_class(g['promedio'])
-                    prev_prom = g['promedio']
-                    pos_interna += 1
+            # Query para promedio filtrado por grupos específicos
+            query_agrup = f"""
+                SELECT {PROMEDIO_ROLLUP} as promedio,
+                       COALESCE(SUM(r.supervisiones), 0) as total_supervisiones,
+                       COUNT(DISTINCT g.id) as total_grupos,
+                       COUNT(DISTINCT s.id) as total_sucursales
+                FROM grupos_operativos g
+                JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
+                JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo
+                WHERE g.activo = true AND g.id IN :grupo_ids
+            """
+            params_agrup = {'grupo_ids': tuple(grupos_filtrados_ids), 'tipo': tipo_rollup(tipo)}
+            if periodo_id and periodo_id != 'all':
+                query_agrup += " AND r.periodo_id = :periodo_id"
+                params_agrup['periodo_id'] = periodo_id
+            agrup_data = db.session.execute(text(query_agrup), params_agrup).fetchone()
+        else:
+            # Usar función helper para calcular promedio de toda la agrupación
+            agrup_data = calcular_promedio_agrupacion(config['patron'], tipo, periodo_id)
+
+        if agrup_data and agrup_data[0] is not None:
+            promedio_agrup = round(float(agrup_data[0]), 2)
+            total_supervisiones = agrup_data[1] or 0
+            total_grupos = agrup_data[2] or len(grupos_en_agrupacion)
+            total_sucursales = agrup_data[3] or 0
+        else:
+            # Sin supervisiones
+            promedio_agrup = None
+            total_supervisiones = 0
+            total_grupos = len(grupos_en_agrupacion)
+            total_sucursales = sum(g['total_sucursales'] for g in grupos_en_agrupacion)
+
+        # Ordenar grupos dentro de la agrupación por promedio
+        grupos_ordenados = sorted(
+            grupos_en_agrupacion,
+            key=lambda x: (x['promedio'] is None, -(x['promedio'] or 0))
+        )
+
+        # Asignar posiciones internas a grupos
+        pos_interna = 1
+        prev_prom = None
+        for g in grupos_ordenados:
+            if g['promedio'] is not None:
+                if prev_prom is not None and g['promedio'] == prev_prom:
+                    g['posicion_interna'] = grupos_ordenados[grupos_ordenados.index(g) - 1].get('posicion_interna', pos_interna)
                 else:
-                    g['posicion_interna'] = None
-                    g['color'] = 'gray'
-
-            agrupacion_item = {
-                'tipo': 'agrupacion',
-                'id': f'agrupacion-{key}',
-                'key': key,
-                'nombre': config['nombre'],
-                'promedio': promedio_agrup,
-                'color': get_color_class(promedio_agrup) if promedio_agrup else 'gray',
-                'total_grupos': total_grupos,
-                'total_sucursales': total_sucursales,
-                'total_supervisiones': total_supervisiones,
-                'grupos': grupos_ordenados
-            }
-            agrupaciones_items.append(agrupacion_item)
+                    g['posicion_interna'] = pos_interna
+                g['color'] = get_color_class(g['promedio'])
+                prev_prom = g['promedio']
+                pos_interna += 1
+            else:
+                g['posicion_interna'] = None
+                g['color'] = 'gray'
+
+        agrupacion_item = {
+            'tipo': 'agrupacion',
+            'id': f'agrupacion-{key}',
+            'key': key,
+            'nombre': config['nombre'],
+            'promedio': promedio_agrup,
+            'color': get_color_class(promedio_agrup) if promedio_agrup else 'gray',
+            'total_grupos': total_grupos,
+            'total_sucursales': total_sucursales,
+            'total_supervisiones': total_supervisiones,
+            'grupos': grupos_ordenados
+        }
+        agrupaciones_items.append(agrupacion_item)
 
-        # Combinar agrupaciones + grupos independientes
-        todos_items = agrupaciones_items + grupos_independientes
+    # Combinar agrupaciones + grupos independientes
+    todos_items = agrupaciones_items + grupos_independientes
 
-        # Separar con y sin supervisiones para ranking global
-        con_supervisiones = []
-        sin_supervisiones = []
+    # Separar con y sin supervisiones para ranking global
+    con_supervisiones = []
+    sin_supervisiones = []
 
-        for item in todos_items:
-            if item['tipo'] == 'agrupacion':
-                if item['total_supervisiones'] > 0 and item['promedio'] is not None:
-                    con_supervisiones.append(item)
-                else:
-                    sin_supervisiones.append(item)
+    for item in todos_items:
+        if item['tipo'] == 'agrupacion':
+            if item['total_supervisiones'] > 0 and item['promedio'] is not None:
+                con_supervisiones.append(item)
             else:
-                if item['total_supervisiones'] > 0 and item['promedio'] is not None:
-                    con_supervisiones.append(item)
-                else:
-                    sin_supervisiones.append(item)
-
-        # Ordenar por promedio
-        con_supervisiones.sort(key=lambda x: -(x['promedio'] or 0))
-
-        # Asignar posiciones globales con empates
-        ranking = []
-        pos = 1
-        prev_promedio = None
-        for item in con_supervisiones:
-            if prev_promedio is not None and item['promedio'] == prev_promedio:
-                item['posicion'] = ranking[-1]['posicion']
+                sin_supervisiones.append(item)
+        else:
+            if item['total_supervisiones'] > 0 and item['promedio'] is not None:
+                con_supervisiones.append(item)
             else:
-                item['posicion'] = pos
-
-            if item['tipo'] != 'agrupacion':
-                item['color'] = get_color_class(item['promedio'])
-            ranking.append(item)
-            prev_promedio = item['promedio']
-            pos += 1
-
-        # Agregar items sin supervisiones al final
-        for item in sin_supervisiones:
-            item['posicion'] = None
-            if item['tipo'] != 'agrupacion':
-                item['color'] = 'gray'
-                item['promedio'] = None
-            ranking.append(item)
+                sin_supervisiones.append(item)
+
+    # Ordenar por promedio
+    con_supervisiones.sort(key=lambda x: -(x['promedio'] or 0))
+
+    # Asignar posiciones globales con empates
+    ranking = []
+    pos = 1
+    prev_promedio = None
+    for item in con_supervisiones:
+        if prev_promedio is not None and item['promedio'] == prev_promedio:
+            item['posicion'] = ranking[-1]['posicion']
+        else:
+            item['posicion'] = pos
 
-        return jsonify({'success': True, 'data': ranking})
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        if item['tipo'] != 'agrupacion':
+            item['color'] = get_color_class(item['promedio'])
+        ranking.append(item)
+        prev_promedio = item['promedio']
+        pos += 1
+
+    # Agregar items sin supervisiones al final
+    for item in sin_supervisiones:
+        item['posicion'] = None
+        if item['tipo'] != 'agrupacion':
+            item['color'] = 'gray'
+            item['promedio'] = None
+        ranking.append(item)
+
+    return ranking
 
 @app.route('/api/ranking/sucursales/<tipo>')
+@cache_api
 def api_ranking_sucursales(tipo):
     """Ranking de sucursales - incluye todas las 86, con empates"""
     try:
-        periodo_id = request.args.get('periodo_id')
-        grupo_id = request.args.get('grupo_id')
         territorio = request.args.get('territorio')  # local, foranea
+        ranking = ranking_sucursales(tipo, request.args.get('periodo_id'), request.args.get('grupo_id'), territorio)
+        return jsonify({'success': True, 'data': ranking})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
+def ranking_sucursales(tipo, periodo_id=None, grupo_id=None, territorio=None):
+    """Sucursales activas ordenadas por promedio, con posiciones, empates y pendientes al final"""
+    # Query que incluye TODAS las sucursales
+    filtro_periodo = ''
+    params = {'tipo': tipo_rollup(tipo)}
+    if periodo_id and periodo_id != 'all':
+        filtro_periodo = ' AND r.periodo_id = :periodo_id'
+        params['periodo_id'] = periodo_id
+    query = f"""
+        SELECT s.id, s.nombre, g.nombre as grupo_nombre, g.id as grupo_id,
+               s.clasificacion,
+               {PROMEDIO_ROLLUP} as promedio,
+               COALESCE(SUM(r.supervisiones), 0) as total_supervisiones
+        FROM sucursales s
+        LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
+        LEFT JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo{filtro_periodo}
+        WHERE s.activo = true
+    """
 
-        # Query que incluye TODAS las sucursales
-        if periodo_id and periodo_id != 'all':
-            query = f"""
-                SELECT s.id, s.nombre, g.nombre as grupo_nombre, g.id as grupo_id,
-                       s.clasificacion,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(sup.id) as total_supervisiones
-                FROM sucursales s
-                LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id AND sup.periodo_id = :periodo_id
-                WHERE s.activo = true
-            """
+    if grupo_id:
+        query += " AND s.grupo_operativo_id = :grupo_id"
+        params['grupo_id'] = grupo_id
+
+    # Filtro por territorio (clasificacion de sucursal)
+    if territorio and territorio != 'todas':
+        if territorio == 'local':
+            query += " AND s.clasificacion = 'local'"
+        elif territorio == 'foranea':
+            query += " AND s.clasificacion = 'foraneo'"
+
+    query += " GROUP BY s.id, s.nombre, g.nombre, g.id, s.clasificacion"
+    query += " ORDER BY promedio DESC NULLS LAST, s.nombre ASC"
+
+    result = db.session.execute(text(query), params)
+    rows = list(result)
+
+    # Separar supervisadas de pendientes
+    supervisadas = []
+    pendientes = []
+
+    for row in rows:
+        item = {
+            'id': row[0],
+            'nombre': row[1],
+            'grupo_nombre': row[2],
+            'grupo_id': row[3],
+            'clasificacion': row[4] or 'local',
+            'promedio': round(float(row[5]), 2) if row[5] else None,
+            'total_supervisiones': row[6]
+        }
+        if row[6] > 0 and row[5] is not None:
+            supervisadas.append(item)
         else:
-            query = f"""
-                SELECT s.id, s.nombre, g.nombre as grupo_nombre, g.id as grupo_id,
-                       s.clasificacion,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(sup.id) as total_supervisiones
-                FROM sucursales s
-                LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id
-                WHERE s.activo = true
-            """
-
-        params = {}
-        if periodo_id and periodo_id != 'all':
-            params['periodo_id'] = periodo_id
-
-        if grupo_id:
-            query += " AND s.grupo_operativo_id = :grupo_id"
-            params['grupo_id'] = grupo_id
-
-        # Filtro por territorio (clasificacion de sucursal)
-        if territorio and territorio != 'todas':
-            if territorio == 'local':
-                query += " AND s.clasificacion = 'local'"
-            elif territorio == 'foranea':
-                query += " AND s.clasificacion = 'foraneo'"
-
-        query += " GROUP BY s.id, s.nombre, g.nombre, g.id, s.clasificacion"
-        query += " ORDER BY promedio DESC NULLS LAST, s.nombre ASC"
-
-        result = db.session.execute(text(query), params)
-        rows = list(result)
-
-        # Separar supervisadas de pendientes
-        supervisadas = []
-        pendientes = []
-
-        for row in rows:
-            item = {
-                'id': row[0],
-                'nombre': row[1],
-                'grupo_nombre': row[2],
-                'grupo_id': row[3],
-                'clasificacion': row[4] or 'local',
-                'promedio': round(float(row[5]), 2) if row[5] else None,
-                'total_supervisiones': row[6]
-            }
-            if row[6] > 0 and row[5] is not None:
-                supervisadas.append(item)
-            else:
-                pendientes.append(item)
-
-        # Asignar posiciones con empates para supervisadas
-        ranking = []
-        pos = 1
-        prev_promedio = None
-        for i, item in enumerate(supervisadas):
-            if prev_promedio is not None and item['promedio'] == prev_promedio:
-                # Empate - misma posición
-                item['posicion'] = ranking[-1]['posicion']
-            else:
-                item['posicion'] = pos
+            pendientes.append(item)
+
+    # Asignar posiciones con empates para supervisadas
+    ranking = []
+    pos = 1
+    prev_promedio = None
+    for i, item in enumerate(supervisadas):
+        if prev_promedio is not None and item['promedio'] == prev_promedio:
+            # Empate - misma posición
+            item['posicion'] = ranking[-1]['posicion']
+        else:
+            item['posicion'] = pos
 
-            item['color'] = get_color_class(item['promedio'])
-            ranking.append(item)
-            prev_promedio = item['promedio']
-            pos += 1
+        item['color'] = get_color_class(item['promedio'])
+        ranking.append(item)
+        prev_promedio = item['promedio']
+        pos += 1
 
-        # Agregar pendientes al final (sin posición)
-        for item in pendientes:
-            item['posicion'] = None
-            item['color'] = 'gray'
-            item['promedio'] = None
-            ranking.append(item)
+    # Agregar pendientes al final (sin posición)
+    for item in pendientes:
+        item['posicion'] = None
+        item['color'] = 'gray'
+        item['promedio'] = None
+        ranking.append(item)
 
-        return jsonify({'success': True, 'data': ranking})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return ranking
 
 # ============ API ENDPOINTS - DRILL-DOWNS ============
 @app.route('/api/grupo/<int:grupo_id>/<tipo>')
+@cache_api
 def api_grupo_detalle(grupo_id, tipo):
     """Detalle de un grupo operativo"""
     try:
@@ -793,7 +904,7 @@ def api_grupo_detalle(grupo_id, tipo):
         """
         if periodo_id:
             query_suc += " AND (sup.periodo_id = :periodo_id OR sup.periodo_id IS NULL)"
-        query_suc += " GROUP BY s.id, s.nombre ORDER BY promedio DESC"
+        query_suc += " GROUP BY s.id, s.nombre ORDER BY promedio DESC, s.nombre ASC"
 
         result = db.session.execute(text(query_suc), params)
         sucursales = []
@@ -820,6 +931,7 @@ def api_grupo_detalle(grupo_id, tipo):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/sucursal/<int:sucursal_id>/<tipo>')
+@cache_api
 def api_sucursal_detalle(sucursal_id, tipo):
     """Detalle de una sucursal con áreas/KPIs"""
     try:
@@ -929,6 +1041,7 @@ def api_sucursal_detalle(sucursal_id, tipo):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/sucursal-tendencia/<int:sucursal_id>/<tipo>')
+@cache_api
 def api_sucursal_tendencia(sucursal_id, tipo):
     """Últimas 4 supervisiones individuales de una sucursal"""
     try:
@@ -939,7 +1052,7 @@ def api_sucursal_tendencia(sucursal_id, tipo):
             SELECT sup.id, sup.calificacion_general, sup.fecha_supervision, sup.supervisor
             FROM {tabla} sup
             WHERE sup.sucursal_id = :sucursal_id
-            ORDER BY sup.fecha_supervision DESC
+            ORDER BY sup.fecha_supervision DESC, sup.id DESC
             LIMIT 4
         """), {'sucursal_id': sucursal_id})
 
@@ -964,6 +1077,7 @@ def api_sucursal_tendencia(sucursal_id, tipo):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/supervision/<int:supervision_id>/areas/<tipo>')
+@cache_api
 def api_supervision_areas(supervision_id, tipo):
     """Obtener áreas/KPIs de una supervisión específica"""
     try:
@@ -1060,77 +1174,68 @@ def api_supervision_areas(supervision_id, tipo):
 
 # ============ API ENDPOINTS - MAPA ============
 @app.route('/api/mapa/<tipo>')
+@cache_api
 def api_mapa(tipo):
     """Datos para el mapa - muestra TODAS las sucursales siempre"""
     try:
-        periodo_id = request.args.get('periodo_id')
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
-
-        # Query que incluye TODAS las sucursales con coordenadas fijas
-        if periodo_id and periodo_id != 'all':
-            query = f"""
-                SELECT s.id, s.nombre, g.nombre as grupo_nombre,
-                       s.latitud as lat, s.longitud as lng,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(sup.id) as supervisiones
-                FROM sucursales s
-                LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id AND sup.periodo_id = :periodo_id
-                WHERE s.activo = true AND s.latitud IS NOT NULL AND s.longitud IS NOT NULL
-                GROUP BY s.id, s.nombre, g.nombre, s.latitud, s.longitud
-                ORDER BY promedio DESC NULLS LAST
-            """
-            params = {'periodo_id': periodo_id}
-        else:
-            query = f"""
-                SELECT s.id, s.nombre, g.nombre as grupo_nombre,
-                       s.latitud as lat, s.longitud as lng,
-                       AVG(sup.calificacion_general) as promedio,
-                       COUNT(sup.id) as supervisiones
-                FROM sucursales s
-                LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
-                LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id
-                WHERE s.activo = true AND s.latitud IS NOT NULL AND s.longitud IS NOT NULL
-                GROUP BY s.id, s.nombre, g.nombre, s.latitud, s.longitud
-                ORDER BY promedio DESC NULLS LAST
-            """
-            params = {}
+        return jsonify({'success': True, 'data': marcadores_mapa(tipo, request.args.get('periodo_id'))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        result = db.session.execute(text(query), params)
-        markers = []
-        for row in result:
-            promedio = round(float(row[5]), 2) if row[5] else None
-            supervisiones = row[6] or 0
+def marcadores_mapa(tipo, periodo_id=None):
+    """Marcador por sucursal activa con coordenadas; gris si no tiene supervisiones"""
+    # Query que incluye TODAS las sucursales con coordenadas fijas
+    filtro_periodo = ''
+    params = {'tipo': tipo_rollup(tipo)}
+    if periodo_id and periodo_id != 'all':
+        filtro_periodo = ' AND r.periodo_id = :periodo_id'
+        params['periodo_id'] = periodo_id
+    query = f"""
+        SELECT s.id, s.nombre, g.nombre as grupo_nombre,
+               s.latitud as lat, s.longitud as lng,
+               {PROMEDIO_ROLLUP} as promedio,
+               COALESCE(SUM(r.supervisiones), 0) as supervisiones
+        FROM sucursales s
+        LEFT JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
+        LEFT JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo{filtro_periodo}
+        WHERE s.activo = true AND s.latitud IS NOT NULL AND s.longitud IS NOT NULL
+        GROUP BY s.id, s.nombre, g.nombre, s.latitud, s.longitud
+        ORDER BY promedio DESC NULLS LAST, s.nombre ASC
+    """
 
-            # Color: gris si no hay supervisiones, según promedio si hay
-            if supervisiones > 0 and promedio is not None:
-                color = get_color_class(promedio)
-            else:
-                color = 'gray'
-                promedio = None
+    result = db.session.execute(text(query), params)
+    markers = []
+    for row in result:
+        promedio = round(float(row[5]), 2) if row[5] else None
+        supervisiones = row[6] or 0
 
-            markers.append({
-                'id': row[0],
-                'nombre': row[1],
-                'grupo': row[2],
-                'lat': float(row[3]),
-                'lng': float(row[4]),
-                'promedio': promedio,
-                'color': color,
-                'supervisiones': supervisiones
-            })
+        # Color: gris si no hay supervisiones, según promedio si hay
+        if supervisiones > 0 and promedio is not None:
+            color = get_color_class(promedio)
+        else:
+            color = 'gray'
+            promedio = None
+
+        markers.append({
+            'id': row[0],
+            'nombre': row[1],
+            'grupo': row[2],
+            'lat': float(row[3]),
+            'lng': float(row[4]),
+            'promedio': promedio,
+            'color': color,
+            'supervisiones': supervisiones
+        })
 
-        return jsonify({'success': True, 'data': markers})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return markers
 
 # ============ API ENDPOINTS - HISTÓRICO ============
 @app.route('/api/historico/<tipo>')
+@cache_api
 def api_historico(tipo):
     """Datos históricos por período CAS estilo McKinsey"""
     try:
         territorio = request.args.get('territorio', 'all')
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
 
         # Obtener todos los períodos
         periodos = db.session.execute(text("""
@@ -1139,16 +1244,15 @@ def api_historico(tipo):
 
         # Obtener datos por grupo y período
         result = db.session.execute(text(f"""
-            SELECT g.id, g.nombre, p.nombre as periodo_nombre, AVG(sup.calificacion_general) as promedio,
-                   COUNT(sup.id) as evaluaciones
+            SELECT g.id, g.nombre, p.nombre as periodo_nombre, {PROMEDIO_ROLLUP} as promedio,
+                   COALESCE(SUM(r.supervisiones), 0) as evaluaciones
             FROM grupos_operativos g
             CROSS JOIN periodos_cas p
-            LEFT JOIN sucursales s ON g.id = s.grupo_operativo_id AND s.activo = true
-            LEFT JOIN {tabla} sup ON s.id = sup.sucursal_id AND sup.periodo_id = p.id
+            LEFT JOIN rollup_grupo r ON r.grupo_id = g.id AND r.periodo_id = p.id AND r.tipo = :tipo
             WHERE g.activo = true
             GROUP BY g.id, g.nombre, p.nombre, p.fecha_inicio
             ORDER BY g.nombre, p.fecha_inicio
-        """))
+        """), {'tipo': tipo_rollup(tipo)})
 
         # Organizar datos
         grupos_data = {}
@@ -1214,27 +1318,27 @@ def api_historico(tipo):
 
 # ============ API ENDPOINTS - ALERTAS ============
 @app.route('/api/alertas/<tipo>')
+@cache_api
 def api_alertas(tipo):
     """Alertas de rendimiento"""
     try:
         periodo_id = request.args.get('periodo_id')
-        tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
 
         alertas = []
 
         # Alertas críticas (< 70%)
         query_criticos = f"""
-            SELECT s.id, s.nombre, g.nombre as grupo, AVG(sup.calificacion_general) as promedio
+            SELECT s.id, s.nombre, g.nombre as grupo, {PROMEDIO_ROLLUP} as promedio
             FROM sucursales s
             JOIN grupos_operativos g ON s.grupo_operativo_id = g.id
-            JOIN {tabla} sup ON s.id = sup.sucursal_id
+            JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo
             WHERE s.activo = true
         """
-        params = {}
+        params = {'tipo': tipo_rollup(tipo)}
         if periodo_id:
-            query_criticos += " AND sup.periodo_id = :periodo_id"
+            query_criticos += " AND r.periodo_id = :periodo_id"
             params['periodo_id'] = periodo_id
-        query_criticos += " GROUP BY s.id, s.nombre, g.nombre HAVING AVG(sup.calificacion_general) < 70 ORDER BY promedio"
+        query_criticos += f" GROUP BY s.id, s.nombre, g.nombre HAVING {PROMEDIO_ROLLUP} < 70 ORDER BY promedio, s.nombre"
 
         result = db.session.execute(text(query_criticos), params)
         for row in result:
@@ -1248,15 +1352,15 @@ def api_alertas(tipo):
 
         # Alertas warning (caída de rendimiento - grupos bajo 80%)
         query_warning = f"""
-            SELECT g.id, g.nombre, AVG(sup.calificacion_general) as promedio
+            SELECT g.id, g.nombre, {PROMEDIO_ROLLUP} as promedio
             FROM grupos_operativos g
             JOIN sucursales s ON g.id = s.grupo_operativo_id
-            JOIN {tabla} sup ON s.id = sup.sucursal_id
+            JOIN rollup_sucursal r ON s.id = r.sucursal_id AND r.tipo = :tipo
             WHERE g.activo = true
         """
         if periodo_id:
-            query_warning += " AND sup.periodo_id = :periodo_id"
-        query_warning += " GROUP BY g.id, g.nombre HAVING AVG(sup.calificacion_general) < 80 AND AVG(sup.calificacion_general) >= 70 ORDER BY promedio"
+            query_warning += " AND r.periodo_id = :periodo_id"
+        query_warning += f" GROUP BY g.id, g.nombre HAVING {PROMEDIO_ROLLUP} < 80 AND {PROMEDIO_ROLLUP} >= 70 ORDER BY promedio, g.nombre"
 
         result = db.session.execute(text(query_warning), params)
         for row in result:
@@ -1279,6 +1383,35 @@ def api_alertas(tipo):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ============ API ENDPOINTS - BOOTSTRAP ============
+@app.route('/api/bootstrap/<tipo>')
+@cache_api
+def api_bootstrap(tipo):
+    """
+    Primer render del dashboard en una sola respuesta
+
+    Contexto, KPIs, ranking de grupos y de sucursales y marcadores del mapa del
+    periodo actual (el que resuelve periodo-contexto), con las mismas funciones
+    que sus endpoints y sobre la misma sesión (una conexión) de la request.
+    """
+    try:
+        territorio = request.args.get('territorio')
+        contexto = contexto_periodo(tipo)
+        periodo_id = contexto['periodo_actual']['id'] if contexto['periodo_actual'] else None
+        return jsonify({
+            'success': True,
+            'data': {
+                'contexto': contexto,
+                'periodo_id': periodo_id,
+                'kpis': calcular_kpis(tipo, periodo_id),
+                'ranking_grupos': ranking_grupos(tipo, periodo_id, territorio),
+                'ranking_sucursales': ranking_sucursales(tipo, periodo_id, territorio=territorio),
+                'mapa': marcadores_mapa(tipo, periodo_id)
+            }
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============ API ENDPOINTS - HEALTH ============
 @app.route('/api/health')
 def health():
@@ -1289,6 +1422,11 @@ def health():
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}), 500
 
+@app.route('/api/cache')
+def api_cache():
+    """Estadísticas del cache de respuestas de este worker"""
+    return jsonify({'success': True, 'data': cache_respuestas.stats()})
+
 # ============ ADMIN API ENDPOINTS ============
 @app.route('/api/admin/tables')
 @login_required
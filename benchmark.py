@@ -0,0 +1,846 @@
+#!/usr/bin/env python3
+"""
+EPL CAS ETL 2026 - Benchmarks
+Mide el rendimiento del ETL contra un servidor Zenput falso local
+
+Ejecutar: python benchmark.py fetch [--paginas 50] [--latencia 0.15] [--workers 1,4,8] [--fallos 0.1]
+          python benchmark.py stream [--paginas 10,40]
+          python benchmark.py write --db postgresql://... [--submissions 2000]
+          python benchmark.py titulos [--submissions 2000]
+          python benchmark.py parse [--submissions 10000]
+          python benchmark.py e2e --db postgresql://... [--escalas 1,10,100] [--latencia 0.05]
+          python benchmark.py procesos [--submissions 100000] [--procesos 1,2,4]
+          python benchmark.py kpis --db postgresql://... [--escalas 10,100] [--repeticiones 200]
+
+Los benchmarks con base de datos crean y recrean el esquema `bench_etl`;
+nunca tocan las tablas de `public`.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import event, text
+
+import etl_sync
+
+# ============================================================
+# DATOS SINTÉTICOS
+# ============================================================
+
+SUPERVISORES = ['Supervisor %02d' % i for i in range(1, 13)]
+LOCATIONS = list(range(1000, 1086))
+
+def _answer(title, value, field_type='formula'):
+    return {'field_type': field_type, 'title': title, 'value': value}
+
+def generar_submission(sub_id, tipo, fecha, rnd, visita=None):
+    """Genera una submission con la forma que entrega Zenput
+
+    `visita` = (location_id, supervisor) fija quién y dónde; sin ella se eligen al azar.
+    """
+    answers = []
+    # Preguntas sí/no que el ETL ignora (la mayoría del payload real)
+    for i in range(60):
+        answers.append(_answer(f'PREGUNTA {i + 1}', rnd.choice(['SI', 'NO']), 'yesno'))
+
+    # Las fórmulas de cada sección van al final; la calificación general es la última
+    if tipo == 'operativas':
+        for titulo in etl_sync.AREA_MAP:
+            answers.append(_answer(f'{titulo} PORCENTAJE %', round(rnd.uniform(50, 100), 2)))
+        answers.append(_answer('PORCENTAJE %', round(rnd.uniform(60, 100), 2)))
+    else:
+        for titulo in etl_sync.KPI_MAP:
+            answers.append(_answer(f'{titulo} CALIFICACION %', round(rnd.uniform(50, 100), 2)))
+        answers.append(_answer('CALIFICACION PORCENTAJE %', round(rnd.uniform(60, 100), 2)))
+
+    return {
+        'id': sub_id,
+        'smetadata': {
+            'location': {'id': rnd.choice(LOCATIONS) if visita is None else visita[0]},
+            'created_by': {'display_name': rnd.choice(SUPERVISORES) if visita is None else visita[1]},
+            'date_submitted': fecha.isoformat(),
+            'lat': 25.67 + rnd.uniform(-0.5, 0.5),
+            'lon': -100.31 + rnd.uniform(-0.5, 0.5),
+        },
+        'answers': answers,
+    }
+
+def generar_submissions(tipo, total, seed=2026):
+    """Lista de submissions ordenadas por fecha"""
+    rnd = random.Random(seed)
+    base = datetime(2026, 1, 5, 8, 0, 0)
+    primer_id = 500000000 if tipo == 'operativas' else 600000000
+    return [generar_submission(primer_id + i, tipo, base + timedelta(minutes=37 * i), rnd)
+            for i in range(total)]
+
+def generar_volumen(escala, seed=2026):
+    """
+    Submissions realistas de `escala` periodos de 4 semanas (1x = un periodo)
+
+    En cada periodo las 86 sucursales reciben una visita y en ella se llenan
+    ambos formularios; cada supervisor visita a lo más una sucursal por día.
+    Incluye los casos sucios que ve el ETL en producción:
+      - ~10% de seguridad sin location (se resuelve con la operativa del día)
+      - ~1% de seguridad sin location ni operativa del supervisor ese día
+      - ~2% de operativas con una location que no está en sucursales
+      - ~3% de submissions repetidas más adelante en la paginación
+
+    Returns:
+        {tipo: [submissions]} en orden de date_submitted
+    """
+    rnd = random.Random(seed)
+    base = datetime(2026, 1, 5)
+    forms = {'operativas': [], 'seguridad': []}
+    siguiente_id = {'operativas': 500000000, 'seguridad': 600000000}
+
+    def agregar(tipo, fecha, location, supervisor):
+        forms[tipo].append(generar_submission(siguiente_id[tipo], tipo, fecha, rnd, (location, supervisor)))
+        siguiente_id[tipo] += 1
+
+    for periodo in range(escala):
+        sucursales = LOCATIONS[:]
+        rnd.shuffle(sucursales)
+        visitas = []
+        for i, location in enumerate(sucursales):
+            # Bloques de 12 visitas (una por supervisor) en días distintos
+            dia = (i // len(SUPERVISORES)) * 3 + rnd.randrange(3)
+            fecha = base + timedelta(days=28 * periodo + dia, hours=rnd.randint(8, 17),
+                                     minutes=rnd.randrange(60))
+            visitas.append((fecha, location, SUPERVISORES[i % len(SUPERVISORES)]))
+
+        for fecha, location, supervisor in sorted(visitas):
+            agregar('operativas', fecha, location if rnd.random() >= 0.02 else 9000 + rnd.randrange(100),
+                    supervisor)
+            azar = rnd.random()
+            agregar('seguridad', fecha + timedelta(minutes=rnd.randint(5, 40)),
+                    None if azar < 0.11 else location,
+                    'Supervisor Externo' if azar < 0.01 else supervisor)
+
+    for subs in forms.values():
+        for pos in sorted(rnd.sample(range(len(subs)), len(subs) * 3 // 100), reverse=True):
+            subs.insert(rnd.randint(pos + 1, len(subs)), subs[pos])
+    return forms
+
+# Títulos reales con variantes que aparecen en los formularios
+TITULOS_VARIANTES = [
+    'PORCENTAJE %', 'Porcentaje', 'CALIFICACION PORCENTAJE %', 'CALIFICACIÓN HORNOS %',
+    'Area Cocina Fria/Caliente Porcentaje %', 'CUARTO FRIO PORCENTAJE', 'BAÑO PORCENTAJE %',
+    'EXTERIOR SUCURSAL PORCENTAJE', 'TOTAL PUNTOS', 'AZOTEA PORCENTAJE %', 'BODEGA CALIFICACION',
+    'PROGRAMA PROTECCION CIVIL PORCENTAJE %', 'COMEDOR AREA COMEDOR CALIFICACION %', 'FREIDORAS',
+]
+
+# ============================================================
+# SERVIDOR ZENPUT FALSO
+# ============================================================
+
+class FakeZenput:
+    """
+    Sirve /submissions/ con paginación limit/offset como Zenput v3
+
+    `fallos` es la fracción de requests que responden 429 (con Retry-After)
+    o 503 para ejercitar los reintentos del cliente. `latencia_por_submission`
+    hace que las páginas grandes tarden más y `limite_max` topa el limit que
+    se respeta, como el servidor real.
+    """
+
+    def __init__(self, forms, latencia=0.0, fallos=0.0, seed=7, latencia_por_submission=0.0, limite_max=None):
+        self.forms = forms  # {form_id: [submissions]}
+        self.latencia = latencia
+        self.fallos = fallos
+        self.latencia_por_submission = latencia_por_submission
+        self.limite_max = limite_max
+        self.requests = 0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.rstrip('/').endswith('/submissions'):
+                    self.send_error(404)
+                    return
+                qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with fake._lock:
+                    fake.requests += 1
+                    falla = fake._rnd.random() < fake.fallos
+                limit = int(qs.get('limit', 100))
+                if fake.limite_max:
+                    limit = min(limit, fake.limite_max)
+                if fake.latencia or fake.latencia_por_submission:
+                    time.sleep(fake.latencia + fake.latencia_por_submission * limit)
+                if falla:
+                    if fake._rnd.random() < 0.5:
+                        self.send_response(429)
+                        self.send_header('Retry-After', '0')
+                    else:
+                        self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                data = fake.forms.get(int(qs.get('form_template_id', 0)), [])
+                after = qs.get('date_submitted_after')
+                if after:
+                    data = [s for s in data if s['smetadata']['date_submitted'] > after]
+                offset = int(qs.get('offset', 0))
+
+                body = json.dumps({'data': data[offset:offset + limit]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # El cliente se rindió (timeout)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address
+        self.base_url = f'http://{host}:{port}/api/v3'
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+# ============================================================
+# POSTGRES LOCAL (esquema bench_etl)
+# ============================================================
+
+ESQUEMA_BENCH = """
+DROP SCHEMA IF EXISTS bench_etl CASCADE;
+CREATE SCHEMA bench_etl;
+SET search_path = bench_etl;
+
+CREATE TABLE periodos_cas (
+    id SERIAL PRIMARY KEY, codigo TEXT, nombre TEXT,
+    fecha_inicio DATE, fecha_fin DATE, activo BOOLEAN DEFAULT false
+);
+CREATE TABLE grupos_operativos (id SERIAL PRIMARY KEY, nombre TEXT, activo BOOLEAN DEFAULT true);
+CREATE TABLE sucursales (
+    id SERIAL PRIMARY KEY, nombre TEXT, numero INTEGER, estado TEXT, ciudad TEXT,
+    grupo_operativo_id INTEGER REFERENCES grupos_operativos(id), zenput_location_id INTEGER,
+    latitud NUMERIC, longitud NUMERIC, clasificacion TEXT, activo BOOLEAN DEFAULT true
+);
+CREATE TABLE catalogo_areas (id SERIAL PRIMARY KEY, codigo TEXT UNIQUE, nombre TEXT, numero INTEGER);
+CREATE TABLE catalogo_kpis_seguridad (id SERIAL PRIMARY KEY, codigo TEXT UNIQUE, nombre TEXT, numero INTEGER);
+CREATE TABLE supervisiones_operativas (
+    id SERIAL PRIMARY KEY, zenput_submission_id TEXT, sucursal_id INTEGER REFERENCES sucursales(id),
+    periodo_id INTEGER REFERENCES periodos_cas(id), supervisor TEXT, fecha_supervision TIMESTAMP,
+    calificacion_general NUMERIC, lat_entrega NUMERIC, lon_entrega NUMERIC
+);
+CREATE TABLE supervisiones_seguridad (
+    id SERIAL PRIMARY KEY, zenput_submission_id TEXT, sucursal_id INTEGER REFERENCES sucursales(id),
+    periodo_id INTEGER REFERENCES periodos_cas(id), supervisor TEXT, fecha_supervision TIMESTAMP,
+    calificacion_general NUMERIC
+);
+CREATE TABLE supervision_areas (
+    id SERIAL PRIMARY KEY, supervision_id INTEGER REFERENCES supervisiones_operativas(id),
+    area_id INTEGER REFERENCES catalogo_areas(id), porcentaje NUMERIC,
+    UNIQUE (supervision_id, area_id)
+);
+CREATE TABLE seguridad_kpis (
+    id SERIAL PRIMARY KEY, supervision_id INTEGER REFERENCES supervisiones_seguridad(id),
+    kpi_id INTEGER REFERENCES catalogo_kpis_seguridad(id), porcentaje NUMERIC,
+    UNIQUE (supervision_id, kpi_id)
+);
+CREATE TABLE sync_checkpoints (formulario TEXT PRIMARY KEY, ultima_fecha TIMESTAMP);
+CREATE TABLE sync_log (
+    id SERIAL PRIMARY KEY, workflow TEXT, inicio TIMESTAMP, fin TIMESTAMP,
+    registros_nuevos INTEGER, estado TEXT
+);
+"""
+
+def conectar_bench(db_url):
+    """Conexión con search_path fijo al esquema de benchmark"""
+    return etl_sync.conectar(db_url, options='-c search_path=bench_etl')
+
+def crear_esquema_bench(db_url, periodos=26):
+    """Recrea bench_etl con catálogos, 20 grupos, 86 sucursales y periodos de 4 semanas"""
+    with conectar_bench(db_url) as conn:
+        cur = conn.cursor()
+        cur.execute(ESQUEMA_BENCH)
+        for i in range(20):
+            cur.execute("INSERT INTO grupos_operativos (nombre) VALUES (%s)",
+                        (('PLOG ' if i < 3 else 'GRUPO ') + f'{i + 1:02d}',))
+        for i, loc in enumerate(LOCATIONS):
+            cur.execute("""
+                INSERT INTO sucursales (nombre, numero, estado, ciudad, grupo_operativo_id,
+                                        zenput_location_id, latitud, longitud, clasificacion)
+                VALUES (%s, %s, 'Nuevo León', 'Monterrey', %s, %s, %s, %s, %s)
+            """, (f'Sucursal {i + 1}', i + 1, i % 20 + 1, loc, 25.6 + i * 0.01, -100.3 - i * 0.01,
+                  'local' if i % 3 else 'foraneo'))
+        for n, codigo in enumerate(etl_sync.AREA_MAP.values(), 1):
+            cur.execute("INSERT INTO catalogo_areas (codigo, nombre, numero) VALUES (%s, %s, %s) "
+                        "ON CONFLICT DO NOTHING", (codigo, codigo.replace('_', ' ').title(), n))
+        for n, codigo in enumerate(etl_sync.KPI_MAP.values(), 1):
+            cur.execute("INSERT INTO catalogo_kpis_seguridad (codigo, nombre, numero) VALUES (%s, %s, %s)",
+                        (codigo, codigo.replace('_', ' ').title(), n))
+        inicio = datetime(2026, 1, 5).date()
+        for n in range(periodos):
+            cur.execute("""
+                INSERT INTO periodos_cas (codigo, nombre, fecha_inicio, fecha_fin, activo)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (f'P{n + 1:02d}', f'Periodo {n + 1}', inicio + timedelta(days=28 * n),
+                  inicio + timedelta(days=28 * n + 27), n == 0))
+        for config in etl_sync.FORMS.values():
+            cur.execute("INSERT INTO sync_checkpoints (formulario) VALUES (%s)", (config['tabla'],))
+
+def vaciar_supervisiones(conn):
+    conn.cursor().execute("""
+        TRUNCATE supervision_areas, seguridad_kpis, supervisiones_operativas, supervisiones_seguridad
+        RESTART IDENTITY
+    """)
+    conn.commit()
+
+def escribir_fila_a_fila(conn, tipo, submissions):
+    """Ruta de escritura original (una sentencia por supervisión y por área) como referencia"""
+    config = etl_sync.FORMS[tipo]
+    cur = conn.cursor()
+    extract = etl_sync.extract_areas if tipo == 'operativas' else etl_sync.extract_kpis
+    nuevos = 0
+    for sub in submissions:
+        meta = sub['smetadata']
+        submission_id = str(sub['id'])
+        cur.execute(f"SELECT id FROM {config['tabla']} WHERE zenput_submission_id = %s", (submission_id,))
+        if cur.fetchone():
+            continue
+        fecha = meta['date_submitted']
+        cur.execute("SELECT id FROM periodos_cas WHERE %s::date BETWEEN fecha_inicio AND fecha_fin LIMIT 1",
+                    (fecha[:10],))
+        periodo = cur.fetchone()
+        cur.execute(f"""
+            INSERT INTO {config['tabla']}
+            (zenput_submission_id, sucursal_id, periodo_id, supervisor, fecha_supervision, calificacion_general)
+            VALUES (%s, (SELECT id FROM sucursales WHERE zenput_location_id = %s), %s, %s, %s, %s)
+            RETURNING id
+        """, (submission_id, meta['location']['id'], periodo['id'] if periodo else None,
+              meta['created_by']['display_name'], fecha, etl_sync.extract_calificacion_general(sub['answers'])))
+        sup_id = cur.fetchone()['id']
+        nuevos += 1
+        for codigo, porcentaje in extract(sub['answers']).items():
+            cur.execute(f"""
+                INSERT INTO {config['detalle']} (supervision_id, {config['detalle_fk']}, porcentaje)
+                SELECT %s, id, %s FROM {config['catalogo']} WHERE codigo = %s
+                ON CONFLICT DO NOTHING
+            """, (sup_id, porcentaje, codigo))
+    return nuevos
+
+def contar_filas(conn, tipo):
+    config = etl_sync.FORMS[tipo]
+    cur = conn.cursor()
+    cur.execute(f"SELECT (SELECT COUNT(*) FROM {config['tabla']}) + (SELECT COUNT(*) FROM {config['detalle']}) AS n")
+    return cur.fetchone()['n']
+
+def cargar_supervisiones_sql(conn, escala):
+    """Una supervisión por sucursal, periodo y formulario en los primeros `escala` periodos (sin Zenput)"""
+    cur = conn.cursor()
+    cur.execute("SELECT setseed(0.2026)")
+    for tipo, config in etl_sync.FORMS.items():
+        cur.execute(f"""
+            INSERT INTO {config['tabla']} (zenput_submission_id, sucursal_id, periodo_id, supervisor,
+                                           fecha_supervision, calificacion_general)
+            SELECT %(tipo)s || '-' || p.id || '-' || s.id, s.id, p.id, 'Supervisor ' || (s.id %% 12 + 1),
+                   p.fecha_inicio + (s.id %% 28) * INTERVAL '1 day' + INTERVAL '10 hours',
+                   CASE WHEN random() < 0.01 THEN NULL ELSE round((55 + random() * 45)::numeric, 2) END
+            FROM periodos_cas p CROSS JOIN sucursales s
+            WHERE p.id <= %(escala)s
+        """, {'tipo': tipo, 'escala': escala})
+    conn.commit()
+
+def paginas_de(submissions, tam=None):
+    tam = tam or etl_sync.ZENPUT_PAGE_SIZE
+    return [submissions[i:i + tam] for i in range(0, len(submissions), tam)]
+
+# ============================================================
+# IMPLEMENTACIONES ORIGINALES (referencia para comparar)
+# ============================================================
+
+def original_extract_area_code(title):
+    title_clean = title.upper()
+    title_clean = title_clean.replace('CALIFICACION', '').replace('CALIFICACIÓN', '')
+    title_clean = title_clean.replace('PORCENTAJE', '').replace('%', '').strip()
+    for key, code in etl_sync.AREA_MAP.items():
+        if key == title_clean:
+            return code
+    for key, code in etl_sync.AREA_MAP.items():
+        if key in title_clean or title_clean in key:
+            return code
+    if title.strip().upper() in ['PORCENTAJE %', 'PORCENTAJE']:
+        return 'CALIFICACION_GENERAL'
+    return None
+
+def original_extract_areas(answers):
+    areas = {}
+    for ans in answers:
+        if ans.get('field_type') != 'formula':
+            continue
+        title = ans.get('title', '')
+        if 'PORCENTAJE' not in title.upper():
+            continue
+        value = ans.get('value')
+        if value is None:
+            continue
+        codigo = original_extract_area_code(title)
+        if codigo and codigo not in areas:
+            areas[codigo] = value
+    return areas
+
+def original_extract_kpis(answers):
+    kpis = {}
+    for ans in answers:
+        if ans.get('field_type') != 'formula':
+            continue
+        title = ans.get('title', '').upper()
+        value = ans.get('value')
+        if value is None:
+            continue
+        for key, code in etl_sync.KPI_MAP.items():
+            if f'{key} PORCENTAJE' in title or f'{key} CALIFICACION' in title:
+                kpis[code] = value
+                break
+    return kpis
+
+def original_kpis(sesion, tipo, periodo_id):
+    """api_kpis original: nueve sentencias sobre las tablas de supervisiones"""
+    tabla = 'supervisiones_operativas' if tipo == 'operativas' else 'supervisiones_seguridad'
+    con_periodo = periodo_id and periodo_id != 'all'
+    where = " WHERE periodo_id = :periodo_id" if con_periodo else ""
+    params = {'periodo_id': periodo_id} if con_periodo else {}
+
+    def escalar(sql):
+        return sesion.execute(text(sql), params).scalar()
+
+    promedio_periodo = (escalar(f"SELECT AVG(calificacion_general) FROM {tabla}{where}") or 0) if con_periodo else None
+    promedio_acumulado = sesion.execute(text(f"SELECT AVG(calificacion_general) FROM {tabla}")).scalar() or 0
+    total_supervisiones = escalar(f"SELECT COUNT(*) FROM {tabla}{where}") or 0
+    sucursales_supervisadas = escalar(f"SELECT COUNT(DISTINCT sucursal_id) FROM {tabla}{where}") or 0
+    total_sucursales = escalar("SELECT COUNT(*) FROM sucursales WHERE activo = true") or 0
+    total_grupos = escalar("SELECT COUNT(*) FROM grupos_operativos WHERE activo = true") or 0
+    cobertura = round((sucursales_supervisadas / total_sucursales * 100) if total_sucursales > 0 else 0, 1)
+    dist = sesion.execute(text(f"""
+        SELECT
+            SUM(CASE WHEN calificacion_general >= 90 THEN 1 ELSE 0 END) as excelente,
+            SUM(CASE WHEN calificacion_general >= 80 AND calificacion_general < 90 THEN 1 ELSE 0 END) as bueno,
+            SUM(CASE WHEN calificacion_general >= 70 AND calificacion_general < 80 THEN 1 ELSE 0 END) as regular,
+            SUM(CASE WHEN calificacion_general < 70 THEN 1 ELSE 0 END) as critico
+        FROM {tabla}{where}
+    """), params).fetchone()
+    promedio_mostrar = promedio_periodo if promedio_periodo is not None else promedio_acumulado
+    return {
+        'promedio': float(round(promedio_mostrar, 2)),
+        'promedio_periodo': float(round(promedio_periodo, 2)) if promedio_periodo is not None else None,
+        'promedio_acumulado': float(round(promedio_acumulado, 2)),
+        'color': None,
+        'total_supervisiones': int(total_supervisiones),
+        'sucursales_supervisadas': int(sucursales_supervisadas),
+        'total_sucursales': int(total_sucursales),
+        'total_grupos': int(total_grupos),
+        'cobertura': float(cobertura),
+        'distribucion': dict(zip(('excelente', 'bueno', 'regular', 'critico'), (int(v or 0) for v in dist)))
+    }
+
+# ============================================================
+# BENCHMARKS
+# ============================================================
+
+def bench_fetch(paginas, latencia, workers_list, fallos=0.0, latencia_sub=0.0, limite_max=None, timeout=30):
+    """Páginas/s de fetch_zenput con distintos niveles de concurrencia
+
+    `paginas` son de ZENPUT_PAGE_SIZE submissions; el paginador puede pedirlas
+    más grandes o más chicas (ver TamanoPagina).
+    """
+    form_id = etl_sync.FORMS['operativas']['id']
+    # Última página incompleta para ejercitar el corte
+    submissions = generar_submissions('operativas', paginas * etl_sync.ZENPUT_PAGE_SIZE - 7)
+
+    with FakeZenput({form_id: submissions}, latencia=latencia, fallos=fallos,
+                    latencia_por_submission=latencia_sub, limite_max=limite_max) as fake:
+        print(f"fetch: {paginas} páginas, latencia simulada {latencia * 1000:.0f} ms "
+              f"+ {latencia_sub * 1000:.1f} ms/submission, tope={limite_max or '-'}, "
+              f"{fallos:.0%} de respuestas 429/503")
+        for workers in workers_list:
+            fake.requests = 0
+            client = etl_sync.ZenputClient(base_url=fake.base_url, pool_size=workers, backoff=0.05,
+                                           timeout=timeout)
+            inicio = time.monotonic()
+            data = etl_sync.fetch_zenput(form_id, workers=workers, client=client)
+            elapsed = time.monotonic() - inicio
+            stats = client.stats()
+            client.close()
+
+            ordenado = [s['id'] for s in data] == [s['id'] for s in submissions]
+            print(f"  workers={workers:<3} {paginas / elapsed:8.1f} páginas/s  {elapsed:6.2f}s  "
+                  f"requests={fake.requests}  reintentos={stats['reintentos']}  "
+                  f"p50={stats['latencia_p50_ms']}ms  p95={stats['latencia_p95_ms']}ms  "
+                  f"orden={'ok' if ordenado else 'ERROR'}")
+
+def bench_stream(paginas_list):
+    """Memoria pico: lista completa (fetch_zenput) vs. páginas en streaming"""
+    form_id = etl_sync.FORMS['operativas']['id']
+    print("stream: memoria pico de Python (tracemalloc) en el cliente")
+    for paginas in paginas_list:
+        submissions = generar_submissions('operativas', paginas * etl_sync.ZENPUT_PAGE_SIZE)
+        with FakeZenput({form_id: submissions}) as fake:
+            etl_sync.ZENPUT_BASE = fake.base_url
+            for modo in ('lista', 'stream'):
+                tracemalloc.start()
+                if modo == 'lista':
+                    total = len(etl_sync.fetch_zenput(form_id))
+                else:
+                    total = sum(len(p) for p in etl_sync.iter_zenput_pages(form_id))
+                _, pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"  {paginas:>4} páginas  {modo:<7} {total:>6} registros  pico={pico / 1e6:8.1f} MB")
+
+def bench_write(db_url, total):
+    """Filas/s escritas: ruta fila por fila original vs. lotes, y costo de releer la ventana"""
+    crear_esquema_bench(db_url)
+    sync = {'operativas': etl_sync.sync_operativas, 'seguridad': etl_sync.sync_seguridad}
+    print(f"write: {total} submissions por formulario, páginas de {etl_sync.ZENPUT_PAGE_SIZE}")
+    with conectar_bench(db_url) as conn:
+        for tipo in ('operativas', 'seguridad'):
+            paginas = paginas_de(generar_submissions(tipo, total))
+            # 'reproceso' vuelve a leer la misma ventana: todo debe omitirse
+            for modo in ('fila_a_fila', 'lotes', 'reproceso'):
+                if modo != 'reproceso':
+                    vaciar_supervisiones(conn)
+                inicio = time.monotonic()
+                for page in paginas:
+                    if modo == 'fila_a_fila':
+                        escribir_fila_a_fila(conn, tipo, page)
+                    else:
+                        sync[tipo](conn, etl_sync.parse_page(page, tipo))
+                    conn.commit()
+                elapsed = time.monotonic() - inicio
+                filas = contar_filas(conn, tipo)
+                print(f"  {tipo:<11} {modo:<12} {filas:>7} filas  {elapsed:6.2f}s  "
+                      f"{filas / elapsed:9.0f} filas/s")
+
+def bench_titulos(total):
+    """Clasificación de títulos: escaneo lineal original vs. índice compilado y memoizado"""
+    rnd = random.Random(11)
+    casos = []
+    for tipo in ('operativas', 'seguridad'):
+        for sub in generar_submissions(tipo, total):
+            answers = sub['answers']
+            answers.extend(_answer(t, rnd.uniform(0, 100)) for t in TITULOS_VARIANTES)
+            casos.append(answers)
+
+    # Mismo resultado que la implementación original
+    titulos = {a['title'] for answers in casos for a in answers} | {'', 'CUARTO', 'ALMACEN'}
+    difs = [t for t in titulos if etl_sync.extract_area_code(t) != original_extract_area_code(t)]
+    difs += [i for i, answers in enumerate(casos)
+             if etl_sync.extract_areas(answers) != original_extract_areas(answers)
+             or etl_sync.extract_kpis(answers) != original_extract_kpis(answers)]
+
+    respuestas = sum(len(a) for a in casos)
+    print(f"titulos: {len(casos)} submissions, {respuestas} respuestas, "
+          f"{len(titulos)} títulos distintos, diferencias={len(difs)}")
+    for nombre, areas, kpis in (('original', original_extract_areas, original_extract_kpis),
+                                ('indice', etl_sync.extract_areas, etl_sync.extract_kpis)):
+        inicio = time.perf_counter()
+        for answers in casos:
+            areas(answers)
+            kpis(answers)
+        elapsed = time.perf_counter() - inicio
+        print(f"  {nombre:<9} {elapsed:6.3f}s  {len(casos) / elapsed:9.0f} submissions/s  "
+              f"{elapsed / respuestas * 1e6:6.2f} µs/respuesta")
+
+def bench_parse(total):
+    """Tres recorridos de answers (extract_*) vs. parse_submission de una sola pasada"""
+    casos = {tipo: generar_submissions(tipo, total) for tipo in ('operativas', 'seguridad')}
+
+    def tres_pasadas(sub, tipo):
+        answers = sub.get('answers', [])
+        calificacion = etl_sync.extract_calificacion_general(answers)
+        detalle = (etl_sync.extract_areas(answers) if tipo == 'operativas'
+                   else etl_sync.extract_kpis(answers))
+        return calificacion, detalle
+
+    difs = sum(tres_pasadas(sub, tipo) != (r.calificacion, r.detalle)
+               for tipo, subs in casos.items()
+               for sub, r in zip(subs, etl_sync.parse_page(subs, tipo)))
+    print(f"parse: {total} submissions por formulario, diferencias={difs}")
+    for tipo, subs in casos.items():
+        for nombre, fn in (('tres_pasadas', tres_pasadas), ('una_pasada', etl_sync.parse_submission)):
+            inicio = time.perf_counter()
+            for sub in subs:
+                fn(sub, tipo)
+            elapsed = time.perf_counter() - inicio
+            print(f"  {tipo:<11} {nombre:<13} {elapsed:6.3f}s  {total / elapsed:9.0f} submissions/s")
+
+def bench_procesos(total, procesos_list):
+    """Respuestas crudas → registros + miembro del archivo: en el proceso vs. ParsePool"""
+    # 20 páginas distintas que se repiten: el costo por página no depende del id
+    distintas = [json.dumps({'data': p}).encode() for p in paginas_de(generar_volumen(12)['operativas'])][:20]
+    crudas = [distintas[i % len(distintas)] for i in range(total // etl_sync.ZENPUT_PAGE_SIZE)]
+    submissions = sum(len(json.loads(c)['data']) for c in distintas) * len(crudas) // len(distintas)
+    print(f"procesos: {len(crudas)} páginas (~{submissions} submissions, "
+          f"{sum(map(len, crudas)) / 1e6:.0f} MB de JSON), {os.cpu_count()} CPUs")
+
+    inicio = time.perf_counter()
+    for crudo in crudas:
+        etl_sync.procesar_pagina(crudo, 'operativas', True)
+    base = time.perf_counter() - inicio
+    print(f"  {'en proceso':<12} {base:7.2f}s  {submissions / base:9.0f} submissions/s")
+
+    for procesos in procesos_list:
+        parseo = etl_sync.ParsePool(procesos)
+        # Como en el ETL: hilos de descarga que esperan al pool, resultados en orden
+        with ThreadPoolExecutor(max_workers=max(etl_sync.ZENPUT_WORKERS, procesos)) as hilos:
+            list(hilos.map(lambda c: parseo.procesar(c, 'operativas', True), distintas))  # arranque
+            inicio = time.perf_counter()
+            for _ in hilos.map(lambda c: parseo.procesar(c, 'operativas', True), crudas):
+                pass
+            elapsed = time.perf_counter() - inicio
+        parseo.close()
+        print(f"  {f'pool x{procesos}':<12} {elapsed:7.2f}s  {submissions / elapsed:9.0f} submissions/s  "
+              f"{base / elapsed:5.2f}x")
+
+def bench_json(paginas):
+    """CPU y memoria por página: decodificador (json / orjson) con y sin adelgazar_submission"""
+    crudas = [json.dumps({'data': p}).encode() for p in paginas_de(generar_volumen(12)['operativas'])]
+    crudas = [crudas[i % len(crudas)] for i in range(paginas)]
+    print(f"json: {paginas} páginas de ~{sum(map(len, crudas)) / len(crudas) / 1e3:.0f} KB "
+          f"(ms y MB por página; retenido = página en vuelo)")
+    print(f"  {'modo':<18} {'decode':>7} {'adelgazar':>9} {'parse':>7} {'archivo':>8} {'pico':>7} {'retenido':>9}")
+    decodificadores = {'json': None, 'orjson': etl_sync.orjson} if etl_sync.orjson else {'json': None}
+    original = etl_sync.orjson
+    try:
+        for nombre, modulo in decodificadores.items():
+            etl_sync.orjson = modulo
+            for adelgazar in (False, True):
+                segundos = Counter()
+                for crudo in crudas:
+                    t0 = time.perf_counter()
+                    page = etl_sync.decodificar_json(crudo)['data']
+                    t1 = time.perf_counter()
+                    if adelgazar:
+                        page = [etl_sync.adelgazar_submission(sub) for sub in page]
+                    t2 = time.perf_counter()
+                    etl_sync.parse_page(page, 'operativas')
+                    t3 = time.perf_counter()
+                    segundos.update(decode=t1 - t0, adelgazar=t2 - t1, parse=t3 - t2)
+                    if not adelgazar:
+                        etl_sync.RawArchive.miembro(page)
+                        segundos['archivo'] += time.perf_counter() - t3
+
+                tracemalloc.start()
+                page = etl_sync.decodificar_json(crudas[0])['data']
+                if adelgazar:
+                    page = [etl_sync.adelgazar_submission(sub) for sub in page]
+                retenido, pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del page
+
+                ms = {k: v * 1000 / len(crudas) for k, v in segundos.items()}
+                modo = nombre + (' + adelgazar' if adelgazar else '')
+                archivo = f"{ms['archivo']:8.2f}" if not adelgazar else f"{'-':>8}"
+                print(f"  {modo:<18} {ms['decode']:7.2f} {ms['adelgazar']:9.2f} {ms['parse']:7.2f} {archivo} "
+                      f"{pico / 1e6:7.2f} {retenido / 1e6:9.2f}")
+    finally:
+        etl_sync.orjson = original
+
+class Cronometro:
+    """Segundos y registros acumulados por etapa (sumados entre hilos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos = Counter()
+        self.registros = Counter()
+
+    def envolver(self, etapa, fn, contar):
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = fn(*args, **kwargs)
+            elapsed = time.perf_counter() - inicio
+            with self._lock:
+                self.segundos[etapa] += elapsed
+                self.registros[etapa] += contar(args, resultado)
+            return resultado
+        return medido
+
+# (objeto, atributo, etapa, registros de la llamada)
+ETAPAS_E2E = [
+    (etl_sync.ZenputClient, 'get_submissions', 'fetch', lambda args, r: len(r)),
+    (etl_sync, 'parse_page', 'parse', lambda args, r: len(r)),
+    (etl_sync, 'sync_operativas', 'escritura', lambda args, r: len(args[1])),
+    (etl_sync, 'sync_seguridad', 'escritura', lambda args, r: len(args[1])),
+    (etl_sync.RawArchive, 'guardar', 'archivo', lambda args, r: len(args[2])),
+]
+
+def bench_e2e(db_url, escalas, latencia):
+    """run_sync completo (Zenput falso → Postgres local) a varias veces el volumen de un periodo"""
+    for escala in escalas:
+        forms = generar_volumen(escala)
+        crear_esquema_bench(db_url, periodos=max(26, escala + 1))
+        crono = Cronometro()
+        originales = [(obj, attr, getattr(obj, attr)) for obj, attr, _, _ in ETAPAS_E2E]
+        get_db, base, archivo_dir = etl_sync.get_db, etl_sync.ZENPUT_BASE, etl_sync.ETL_ARCHIVE_DIR
+
+        por_form = {etl_sync.FORMS[tipo]['id']: subs for tipo, subs in forms.items()}
+        with tempfile.TemporaryDirectory() as archivo, FakeZenput(por_form, latencia=latencia) as fake:
+            etl_sync.get_db = lambda: conectar_bench(db_url)
+            etl_sync.ZENPUT_BASE = fake.base_url
+            etl_sync.ETL_ARCHIVE_DIR = archivo
+            for obj, attr, etapa, contar in ETAPAS_E2E:
+                setattr(obj, attr, crono.envolver(etapa, getattr(obj, attr), contar))
+            try:
+                inicio = time.monotonic()
+                resultados = etl_sync.run_sync()
+                pared = time.monotonic() - inicio
+            finally:
+                for obj, attr, fn in originales:
+                    setattr(obj, attr, fn)
+                etl_sync.get_db, etl_sync.ZENPUT_BASE, etl_sync.ETL_ARCHIVE_DIR = get_db, base, archivo_dir
+
+        total = sum(len(subs) for subs in forms.values())
+        print(f"e2e {escala}x: {len(forms['operativas'])} operativas + {len(forms['seguridad'])} seguridad "
+              f"(con duplicados), latencia {latencia * 1000:.0f} ms, requests={fake.requests}")
+        print(f"  {'etapa':<11} {'s (suma)':>9} {'registros':>10} {'registros/s':>12}")
+        for etapa in ('fetch', 'parse', 'escritura', 'archivo'):
+            segundos, registros = crono.segundos[etapa], crono.registros[etapa]
+            print(f"  {etapa:<11} {segundos:9.2f} {registros:10d} {registros / segundos if segundos else 0:12.0f}")
+        print(f"  {'pared':<11} {pared:9.2f} {total:10d} {total / pared:12.0f}")
+        with conectar_bench(db_url) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT DISTINCT ON (workflow) workflow, metricas FROM sync_log ORDER BY workflow, id DESC")
+            metricas = {row['workflow']: row['metricas'] for row in cur.fetchall()}
+        for tipo in etl_sync.FORMS:
+            res, m = resultados[tipo], metricas[f'etl_{tipo}']
+            print(f"  {tipo:<11} nuevos={res['nuevos']} omitidos={res['omitidos']} "
+                  f"sin_sucursal={res['sin_sucursal']} | sentencias={m['db']['sentencias']} "
+                  f"BD={m['db']['tiempo_ms']:.0f} ms http_p95={m['http']['latencia_p95_ms']} ms")
+
+def bench_kpis(db_url, escalas, repeticiones):
+    """KPIs del dashboard: nueve sentencias sobre supervisiones vs. una consulta sobre rollups"""
+    sep = '&' if '?' in db_url else '?'
+    os.environ['DATABASE_URL'] = f'{db_url}{sep}options=-csearch_path%3Dbench_etl'
+    import app as dashboard  # Lee DATABASE_URL al importarse
+
+    for escala in escalas:
+        crear_esquema_bench(db_url, periodos=escala + 1)
+        with conectar_bench(db_url) as conn:
+            cargar_supervisiones_sql(conn, escala)
+            etl_sync.asegurar_rollups(conn.cursor())
+        print(f"kpis {escala}x: {escala * len(LOCATIONS)} supervisiones por formulario, "
+              f"{repeticiones} llamadas por caso")
+        print(f"  {'caso':<26} {'ms/llamada':>10} {'sentencias':>10} {'mejora':>7}")
+        with dashboard.app.app_context():
+            sentencias = Counter()
+            contar = lambda *args: sentencias.update(['n'])
+            event.listen(dashboard.db.engine, 'before_cursor_execute', contar)
+            try:
+                for periodo_id in (None, str(escala // 2 + 1)):
+                    fns = (('original', lambda: original_kpis(dashboard.db.session, 'operativas', periodo_id)),
+                           ('una_consulta', lambda: dashboard.calcular_kpis('operativas', periodo_id)))
+                    resultados, base = {}, None
+                    for nombre, fn in fns:
+                        resultados[nombre] = fn()  # Calentar caches de Postgres
+                        sentencias.clear()
+                        inicio = time.perf_counter()
+                        for _ in range(repeticiones):
+                            fn()
+                        ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+                        base = base or ms
+                        caso = f"{nombre} ({'periodo ' + periodo_id if periodo_id else 'todo'})"
+                        print(f"  {caso:<26} {ms:10.2f} {sentencias['n'] // repeticiones:10d} {base / ms:6.1f}x")
+                    resultados['original']['color'] = resultados['una_consulta']['color']
+                    if resultados['original'] != resultados['una_consulta']:
+                        print(f"  ⚠️ diferencias: {resultados}")
+            finally:
+                event.remove(dashboard.db.engine, 'before_cursor_execute', contar)
+                dashboard.db.session.remove()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del ETL EPL CAS')
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p_fetch = sub.add_parser('fetch', help='Descarga paginada desde Zenput falso')
+    p_fetch.add_argument('--paginas', type=int, default=50)
+    p_fetch.add_argument('--latencia', type=float, default=0.15, help='Segundos por request')
+    p_fetch.add_argument('--workers', default='1,4,8')
+    p_fetch.add_argument('--fallos', type=float, default=0.0, help='Fracción de respuestas 429/503')
+    p_fetch.add_argument('--latencia-sub', type=float, default=0.0, help='Segundos extra por submission')
+    p_fetch.add_argument('--limite-max', type=int, default=None, help='Tope de limit del servidor')
+    p_fetch.add_argument('--timeout', type=float, default=30, help='Timeout de lectura del cliente')
+
+    p_stream = sub.add_parser('stream', help='Memoria pico lista vs. streaming')
+    p_stream.add_argument('--paginas', default='10,40')
+
+    p_write = sub.add_parser('write', help='Escritura a Postgres fila por fila vs. lotes')
+    p_write.add_argument('--db', required=True, help='URL de un Postgres local de pruebas')
+    p_write.add_argument('--submissions', type=int, default=2000)
+
+    p_titulos = sub.add_parser('titulos', help='Micro-benchmark de extract_areas / extract_kpis')
+    p_titulos.add_argument('--submissions', type=int, default=2000)
+
+    p_parse = sub.add_parser('parse', help='Parser de una sola pasada vs. extract_*')
+    p_parse.add_argument('--submissions', type=int, default=10000)
+
+    p_json = sub.add_parser('json', help='Decodificación de páginas: json vs. orjson, con y sin adelgazar')
+    p_json.add_argument('--paginas', type=int, default=50)
+
+    p_procesos = sub.add_parser('procesos', help='Parseo en el proceso vs. pool de procesos')
+    p_procesos.add_argument('--submissions', type=int, default=100000)
+    p_procesos.add_argument('--procesos', default='1,2,4')
+
+    p_e2e = sub.add_parser('e2e', help='run_sync completo: fetch, parse y escritura por etapa')
+    p_e2e.add_argument('--db', required=True, help='URL de un Postgres local de pruebas')
+    p_e2e.add_argument('--escalas', default='1,10,100', help='Múltiplos del volumen de un periodo')
+    p_e2e.add_argument('--latencia', type=float, default=0.05, help='Segundos por request')
+
+    p_kpis = sub.add_parser('kpis', help='api_kpis: nueve sentencias vs. una consulta sobre rollups')
+    p_kpis.add_argument('--db', required=True, help='URL de un Postgres local de pruebas')
+    p_kpis.add_argument('--escalas', default='10,100', help='Múltiplos del volumen de un periodo')
+    p_kpis.add_argument('--repeticiones', type=int, default=200)
+
+    args = parser.parse_args()
+    etl_sync.log = lambda *a, **k: None  # Silenciar logs del ETL durante la medición
+
+    if args.bench == 'fetch':
+        bench_fetch(args.paginas, args.latencia, [int(w) for w in args.workers.split(',')], args.fallos,
+                    args.latencia_sub, args.limite_max, args.timeout)
+    elif args.bench == 'stream':
+        bench_stream([int(p) for p in args.paginas.split(',')])
+    elif args.bench == 'write':
+        bench_write(args.db, args.submissions)
+    elif args.bench == 'titulos':
+        bench_titulos(args.submissions)
+    elif args.bench == 'parse':
+        bench_parse(args.submissions)
+    elif args.bench == 'json':
+        bench_json(args.paginas)
+    elif args.bench == 'procesos':
+        bench_procesos(args.submissions, [int(p) for p in args.procesos.split(',')])
+    elif args.bench == 'e2e':
+        bench_e2e(args.db, [int(e) for e in args.escalas.split(',')], args.latencia)
+    elif args.bench == 'kpis':
+        bench_kpis(args.db, [int(e) for e in args.escalas.split(',')], args.repeticiones)
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@ var currentPeriodoId = null;
 var currentPeriodo = null;
 var periodosDisponibles = [];
 var periodoActivoId = null; // ID del periodo marcado como activo
+var periodoProgreso = null; // Progreso del periodo actual (de periodo-contexto / bootstrap)
+var mapaInicial = null; // Marcadores que trajo el bootstrap, hasta abrir el mapa
 var map = null;
 var markers = [];
 var scrollPosition = 0; // Para guardar posición de scroll en iOS
@@ -85,7 +87,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initToggles();
     initTabs();
     initPeriodSelector();
-    loadPeriodoContexto(); // Cargar periodo primero, luego dashboard
+    loadBootstrap(); // Periodo, KPIs, rankings y mapa en una sola request
 });
 
 // ========== PERIODO SELECTOR ==========
@@ -108,39 +110,38 @@ function initPeriodSelector() {
     }
 }
 
+// Primer render (y cambio de tipo): contexto, KPIs, rankings y mapa en una request
+function loadBootstrap() {
+    var url = '/api/bootstrap/' + currentTipo;
+    if (currentTerritorio !== 'todas') {
+        url += '?territorio=' + currentTerritorio;
+    }
+
+    fetch(url)
+        .then(function(res) { return res.json(); })
+        .then(function(data) {
+            if (!data.success || !data.data) {
+                loadPeriodoContexto(); // Flujo por endpoint si el bootstrap falla
+                return;
+            }
+            var d = data.data;
+            aplicarPeriodoContexto(d.contexto);
+            renderKPIs(d.kpis);
+            renderRanking(currentView === 'grupos' ? d.ranking_grupos : d.ranking_sucursales);
+            mapaInicial = { tipo: currentTipo, periodoId: currentPeriodoId, data: d.mapa };
+        })
+        .catch(function(e) {
+            console.error('Error loading bootstrap:', e);
+            loadPeriodoContexto();
+        });
+}
+
 function loadPeriodoContexto() {
     fetch('/api/periodo-contexto/' + currentTipo)
         .then(function(res) { return res.json(); })
         .then(function(data) {
             if (data.success && data.data) {
-                var d = data.data;
-
-                // Guardar periodo actual
-                if (d.periodo_actual) {
-                    currentPeriodo = d.periodo_actual;
-                    currentPeriodoId = d.periodo_actual.id;
-                    periodoActivoId = d.periodo_actual.id; // Guardar el activo
-
-                    // Actualizar UI
-                    var periodName = document.getElementById('periodName');
-                    if (periodName) {
-                        periodName.textContent = d.periodo_actual.codigo || d.periodo_actual.nombre;
-                    }
-                }
-
-                // Guardar lista de periodos con info de activo
-                periodosDisponibles = (d.periodos || []).map(function(p) {
-                    p.activo = (periodoActivoId && p.id == periodoActivoId);
-                    return p;
-                });
-
-                // Actualizar progreso
-                if (d.progreso) {
-                    var progressText = document.getElementById('progressText');
-                    if (progressText) {
-                        progressText.textContent = d.progreso.supervisadas + '/' + d.progreso.total;
-                    }
-                }
+                aplicarPeriodoContexto(data.data);
 
                 // Ahora cargar el dashboard con el periodo
                 loadDashboard();
@@ -152,6 +153,36 @@ function loadPeriodoContexto() {
         });
 }
 
+function aplicarPeriodoContexto(d) {
+    // Guardar periodo actual
+    if (d.periodo_actual) {
+        currentPeriodo = d.periodo_actual;
+        currentPeriodoId = d.periodo_actual.id;
+        periodoActivoId = d.periodo_actual.id; // Guardar el activo
+
+        // Actualizar UI
+        var periodName = document.getElementById('periodName');
+        if (periodName) {
+            periodName.textContent = d.periodo_actual.codigo || d.periodo_actual.nombre;
+        }
+    }
+
+    // Guardar lista de periodos con info de activo
+    periodosDisponibles = (d.periodos || []).map(function(p) {
+        p.activo = (periodoActivoId && p.id == periodoActivoId);
+        return p;
+    });
+
+    // Actualizar progreso
+    periodoProgreso = d.progreso || null;
+    if (d.progreso) {
+        var progressText = document.getElementById('progressText');
+        if (progressText) {
+            progressText.textContent = d.progreso.supervisadas + '/' + d.progreso.total;
+        }
+    }
+}
+
 function openPeriodSheet() {
     var overlay = document.getElementById('periodSheetOverlay');
     var body = document.getElementById('periodSheetBody');
@@ -273,6 +304,15 @@ function selectPeriodo(periodoId) {
 }
 
 function loadPeriodoProgreso() {
+    // El progreso es siempre el del periodo actual: ya vino con el contexto
+    if (periodoProgreso) {
+        var progressText = document.getElementById('progressText');
+        if (progressText) {
+            progressText.textContent = periodoProgreso.supervisadas + '/' + periodoProgreso.total;
+        }
+        return;
+    }
+
     // Recargar solo el progreso
     fetch('/api/periodo-contexto/' + currentTipo)
         .then(function(res) { return res.json(); })
@@ -315,7 +355,7 @@ function initToggles() {
             document.querySelectorAll('.toggle-btn').forEach(function(b) { b.classList.remove('active'); });
             btn.classList.add('active');
             currentTipo = btn.dataset.tipo;
-            loadPeriodoContexto(); // Recargar contexto con nuevo tipo
+            loadBootstrap(); // Recargar contexto y dashboard con nuevo tipo
         });
     });
 
@@ -389,39 +429,7 @@ function loadKPIs() {
         .then(function(data) {
             console.log('KPIs response:', data);
             if (data.success && data.data) {
-                var d = data.data;
-                var promEl = document.getElementById('kpiPromedio');
-                var promLabelEl = document.getElementById('kpiPromedioLabel');
-                var acumEl = document.getElementById('kpiAcumulado');
-                var totalEl = document.getElementById('kpiTotal');
-                var gruposEl = document.getElementById('kpiGrupos');
-                var sucEl = document.getElementById('kpiSucursales');
-
-                // Promedio principal
-                if (promEl) {
-                    promEl.textContent = d.promedio ? d.promedio + '%' : '-';
-                    promEl.className = 'kpi-value ' + (d.color || 'gray');
-                }
-
-                // Label y acumulado
-                if (currentPeriodoId === 'all') {
-                    // Modo "Todos" - solo mostrar acumulado
-                    if (promLabelEl) promLabelEl.textContent = 'Promedio Acumulado';
-                    if (acumEl) acumEl.style.display = 'none';
-                } else {
-                    // Modo periodo específico - mostrar ambos
-                    if (promLabelEl) promLabelEl.textContent = 'Promedio Periodo';
-                    if (acumEl) {
-                        acumEl.style.display = 'block';
-                        acumEl.textContent = 'Acum: ' + (d.promedio_acumulado ? d.promedio_acumulado + '%' : '-');
-                    }
-                }
-
-                if (totalEl) totalEl.textContent = d.total_supervisiones || 0;
-                if (gruposEl) gruposEl.textContent = d.total_grupos || 0;
-                if (sucEl) sucEl.textContent = d.sucursales_supervisadas || 0;
-
-                renderDistribution(d.distribucion || {});
+                renderKPIs(data.data);
             }
         })
         .catch(function(e) {
@@ -429,6 +437,41 @@ function loadKPIs() {
         });
 }
 
+function renderKPIs(d) {
+    var promEl = document.getElementById('kpiPromedio');
+    var promLabelEl = document.getElementById('kpiPromedioLabel');
+    var acumEl = document.getElementById('kpiAcumulado');
+    var totalEl = document.getElementById('kpiTotal');
+    var gruposEl = document.getElementById('kpiGrupos');
+    var sucEl = document.getElementById('kpiSucursales');
+
+    // Promedio principal
+    if (promEl) {
+        promEl.textContent = d.promedio ? d.promedio + '%' : '-';
+        promEl.className = 'kpi-value ' + (d.color || 'gray');
+    }
+
+    // Label y acumulado
+    if (currentPeriodoId === 'all') {
+        // Modo "Todos" - solo mostrar acumulado
+        if (promLabelEl) promLabelEl.textContent = 'Promedio Acumulado';
+        if (acumEl) acumEl.style.display = 'none';
+    } else {
+        // Modo periodo específico - mostrar ambos
+        if (promLabelEl) promLabelEl.textContent = 'Promedio Periodo';
+        if (acumEl) {
+            acumEl.style.display = 'block';
+            acumEl.textContent = 'Acum: ' + (d.promedio_acumulado ? d.promedio_acumulado + '%' : '-');
+        }
+    }
+
+    if (totalEl) totalEl.textContent = d.total_supervisiones || 0;
+    if (gruposEl) gruposEl.textContent = d.total_grupos || 0;
+    if (sucEl) sucEl.textContent = d.sucursales_supervisadas || 0;
+
+    renderDistribution(d.distribucion || {});
+}
+
 function renderDistribution(dist) {
     var container = document.getElementById('distributionBars');
     if (!container) return;
@@ -489,49 +532,7 @@ function loadRanking() {
         .then(function(res) { return res.json(); })
         .then(function(data) {
             console.log('Ranking response:', data);
-            if (data.success && data.data && data.data.length > 0) {
-                var items = data.data;
-
-                if (items.length === 0) {
-                    container.innerHTML = '<div class="empty-state">Sin resultados para este filtro</div>';
-                    return;
-                }
-
-                var html = '';
-
-                if (currentView === 'grupos') {
-                    // Vista de grupos con soporte para agrupaciones
-                    items.forEach(function(item) {
-                        if (item.tipo === 'agrupacion') {
-                            html += renderAgrupacion(item);
-                        } else {
-                            html += renderGrupoItem(item);
-                        }
-                    });
-                } else {
-                    // Vista de sucursales (sin cambios)
-                    html = items.map(function(item) {
-                        var pos = item.posicion;
-                        var isPendiente = pos === null;
-                        var posClass = pos && pos <= 3 ? 'pos-' + pos : '';
-                        var colorClass = item.color || 'gray';
-                        var promedio = item.promedio !== null ? item.promedio + '%' : 'Pendiente';
-
-                        return '<div class="ranking-item ' + (isPendiente ? 'pendiente' : '') + '" onclick="openSucursalModal(' + item.id + ')">' +
-                            '<span class="ranking-pos ' + posClass + '">' + (pos || '-') + '</span>' +
-                            '<div class="ranking-info">' +
-                            '<span class="ranking-name">' + item.nombre + '</span>' +
-                            '<span class="ranking-meta">' + (item.grupo_nombre || '-') + '</span>' +
-                            '</div>' +
-                            '<span class="ranking-score ' + colorClass + '">' + promedio + '</span>' +
-                            '</div>';
-                    }).join('');
-                }
-
-                container.innerHTML = html;
-            } else {
-                container.innerHTML = '<div class="empty-state">No hay datos de ranking</div>';
-            }
+            renderRanking(data.success ? data.data : null);
         })
         .catch(function(e) {
             console.error('Error loading ranking:', e);
@@ -539,6 +540,53 @@ function loadRanking() {
         });
 }
 
+function renderRanking(items) {
+    var container = document.getElementById('rankingList');
+    if (!container) return;
+
+    if (items && items.length > 0) {
+        if (items.length === 0) {
+            container.innerHTML = '<div class="empty-state">Sin resultados para este filtro</div>';
+            return;
+        }
+
+        var html = '';
+
+        if (currentView === 'grupos') {
+            // Vista de grupos con soporte para agrupaciones
+            items.forEach(function(item) {
+                if (item.tipo === 'agrupacion') {
+                    html += renderAgrupacion(item);
+                } else {
+                    html += renderGrupoItem(item);
+                }
+            });
+        } else {
+            // Vista de sucursales (sin cambios)
+            html = items.map(function(item) {
+                var pos = item.posicion;
+                var isPendiente = pos === null;
+                var posClass = pos && pos <= 3 ? 'pos-' + pos : '';
+                var colorClass = item.color || 'gray';
+                var promedio = item.promedio !== null ? item.promedio + '%' : 'Pendiente';
+
+                return '<div class="ranking-item ' + (isPendiente ? 'pendiente' : '') + '" onclick="openSucursalModal(' + item.id + ')">' +
+                    '<span class="ranking-pos ' + posClass + '">' + (pos || '-') + '</span>' +
+                    '<div class="ranking-info">' +
+                    '<span class="ranking-name">' + item.nombre + '</span>' +
+                    '<span class="ranking-meta">' + (item.grupo_nombre || '-') + '</span>' +
+                    '</div>' +
+                    '<span class="ranking-score ' + colorClass + '">' + promedio + '</span>' +
+                    '</div>';
+            }).join('');
+        }
+
+        container.innerHTML = html;
+    } else {
+        container.innerHTML = '<div class="empty-state">No hay datos de ranking</div>';
+    }
+}
+
 // Renderiza un grupo individual
 function renderGrupoItem(item) {
     var pos = item.posicion;
@@ -930,6 +978,15 @@ function loadMapData() {
     markers.forEach(function(m) { map.removeLayer(m); });
     markers = [];
 
+    // Primer render: los marcadores ya vinieron con el bootstrap
+    if (mapaInicial && mapaInicial.tipo === currentTipo && mapaInicial.periodoId === currentPeriodoId) {
+        var inicial = mapaInicial.data;
+        mapaInicial = null;
+        renderMapMarkers(inicial);
+        return;
+    }
+    mapaInicial = null;
+
     var url = '/api/mapa/' + currentTipo;
     if (currentPeriodoId) {
         url += '?periodo_id=' + currentPeriodoId;
@@ -938,48 +995,8 @@ function loadMapData() {
     fetch(url)
         .then(function(res) { return res.json(); })
         .then(function(data) {
-            if (data.success && data.data && data.data.length > 0) {
-                var bounds = [];
-
-                data.data.forEach(function(item) {
-                    if (!item.lat || !item.lng) return;
-
-                    var colorClass = item.color || 'gray';
-                    var color = getMarkerColor(colorClass);
-                    var isPendiente = item.promedio === null;
-
-                    var marker = L.circleMarker([item.lat, item.lng], {
-                        radius: isPendiente ? 8 : 10,
-                        fillColor: color,
-                        color: '#fff',
-                        weight: 2,
-                        opacity: isPendiente ? 0.6 : 1,
-                        fillOpacity: isPendiente ? 0.5 : 0.9
-                    }).addTo(map);
-
-                    // Popup con botón para ver detalle
-                    var scoreText = isPendiente ? 'Pendiente' : item.promedio + '%';
-                    var popupContent = '<div class="map-popup">' +
-                        '<strong>' + item.nombre + '</strong><br>' +
-                        '<span class="popup-grupo">' + (item.grupo || '-') + '</span><br>' +
-                        '<span class="popup-score ' + colorClass + '">' + scoreText + '</span><br>' +
-                        '<button class="popup-btn" onclick="openSucursalModal(' + item.id + ')">Ver Detalle</button>' +
-                        '</div>';
-
-                    marker.bindPopup(popupContent);
-
-                    // También abrir modal al hacer click directamente en el marker
-                    marker.on('dblclick', function() {
-                        openSucursalModal(item.id);
-                    });
-
-                    markers.push(marker);
-                    bounds.push([item.lat, item.lng]);
-                });
-
-                if (bounds.length > 0) {
-                    map.fitBounds(bounds, { padding: [20, 20] });
-                }
+            if (data.success) {
+                renderMapMarkers(data.data);
             }
         })
         .catch(function(e) {
@@ -987,6 +1004,52 @@ function loadMapData() {
         });
 }
 
+function renderMapMarkers(items) {
+    if (items && items.length > 0) {
+        var bounds = [];
+
+        items.forEach(function(item) {
+            if (!item.lat || !item.lng) return;
+
+            var colorClass = item.color || 'gray';
+            var color = getMarkerColor(colorClass);
+            var isPendiente = item.promedio === null;
+
+            var marker = L.circleMarker([item.lat, item.lng], {
+                radius: isPendiente ? 8 : 10,
+                fillColor: color,
+                color: '#fff',
+                weight: 2,
+                opacity: isPendiente ? 0.6 : 1,
+                fillOpacity: isPendiente ? 0.5 : 0.9
+            }).addTo(map);
+
+            // Popup con botón para ver detalle
+            var scoreText = isPendiente ? 'Pendiente' : item.promedio + '%';
+            var popupContent = '<div class="map-popup">' +
+                '<strong>' + item.nombre + '</strong><br>' +
+                '<span class="popup-grupo">' + (item.grupo || '-') + '</span><br>' +
+                '<span class="popup-score ' + colorClass + '">' + scoreText + '</span><br>' +
+                '<button class="popup-btn" onclick="openSucursalModal(' + item.id + ')">Ver Detalle</button>' +
+                '</div>';
+
+            marker.bindPopup(popupContent);
+
+            // También abrir modal al hacer click directamente en el marker
+            marker.on('dblclick', function() {
+                openSucursalModal(item.id);
+            });
+
+            markers.push(marker);
+            bounds.push([item.lat, item.lng]);
+        });
+
+        if (bounds.length > 0) {
+            map.fitBounds(bounds, { padding: [20, 20] });
+        }
+    }
+}
+
 function getMarkerColor(colorClass) {
     // Colores optimizados para mapa claro (más saturados para mejor visibilidad)
     var colors = {